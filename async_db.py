@@ -0,0 +1,341 @@
+"""This file represents an asyncio facade over the Library database"""
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Callable
+from book import Book
+from db import Database
+from page import BooksPage
+
+
+class AsyncDatabase:
+    """
+    Class exposing the Database API as coroutines.
+
+    Reads run on a bounded pool of reader threads, each with its own pooled
+    connection, while all writes go through a single writer thread, so
+    they are serialized and committed on the connection that made them.
+    """
+
+    def __init__(self, database_name: str = 'database.db',
+                 max_readers: int = 4, max_pending: int = 64,
+                 pragmas: dict = None) -> None:
+        """
+        Args:
+        database_name (str): Path of the SQLite database file.
+        max_readers (int): Amount of reader threads.
+        max_pending (int): Maximum amount of calls submitted to the threads
+        at once; further callers wait for a free slot.
+        pragmas (dict): PRAGMA overrides, see Database.
+        """
+
+        self.db = Database(database_name, pooled=True, pragmas=pragmas)
+        self._readers = ThreadPoolExecutor(max_readers,
+                                           thread_name_prefix='db-reader')
+        self._writer = ThreadPoolExecutor(1, thread_name_prefix='db-writer')
+        self._pending = asyncio.Semaphore(max_pending)
+
+
+    async def __aenter__(self) -> 'AsyncDatabase':
+        return self
+
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+
+    async def _read(self, method: Callable, *args, **kwargs):
+        """
+        Runs a blocking read method on a reader thread.
+
+        Behavior:
+        If the awaiting task is cancelled while the query is running, the
+        query is interrupted on the reader's connection, so the thread is
+        freed for other callers. The interrupt is sent under a lock the
+        reader holds while it starts and ends the call, so it can never hit
+        the next call the thread picks up. The call keeps its slot of
+        max_pending until the thread is done with it.
+        """
+
+        lock = threading.Lock()
+        # Connection the call runs on, None before it starts and after it
+        # ends; 'cancelled' once the caller gave up.
+        state = {'connection': None, 'cancelled': False}
+
+        def call():
+            with lock:
+                if state['cancelled']:
+                    raise asyncio.CancelledError()
+                state['connection'] = self.db.connection
+            try:
+                return method(*args, **kwargs)
+            finally:
+                with lock:
+                    state['connection'] = None
+
+        loop = asyncio.get_running_loop()
+        await self._pending.acquire()
+        try:
+            future = self._readers.submit(call)
+        except BaseException:
+            self._pending.release()
+            raise
+        future.add_done_callback(
+            lambda _: loop.call_soon_threadsafe(self._pending.release))
+
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            with lock:
+                state['cancelled'] = True
+                if state['connection'] is not None:
+                    state['connection'].interrupt()
+            raise
+
+
+    async def _write(self, method: Callable, *args, **kwargs):
+        """
+        Runs a blocking write method on the writer thread and commits it.
+
+        Behavior:
+        Writes are never interrupted: once submitted, a cancelled write
+        still runs to completion and is committed, and keeps its slot of
+        max_pending until then. A write that raises is rolled back, so its
+        partial changes are never committed by a later write.
+        """
+
+        def call():
+            try:
+                result = method(*args, **kwargs)
+                self.db.commit_changes()
+            except BaseException:
+                self.db.rollback_changes()
+                raise
+            return result
+
+        await self._pending.acquire()
+        try:
+            future = asyncio.get_running_loop().run_in_executor(
+                self._writer, call)
+        except BaseException:
+            self._pending.release()
+            raise
+        future.add_done_callback(lambda _: self._pending.release())
+
+        return await asyncio.shield(future)
+
+
+    async def search(self, keyword: str, limit: int = None) -> list[tuple]:
+        """Coroutine version of Database.search."""
+
+        return await self._read(self.db.search, keyword, limit)
+
+
+    async def search_full_text(self, keyword: str, columns: list[str] = None,
+                               limit: int = None) -> list[tuple]:
+        """Coroutine version of Database.search_full_text."""
+
+        return await self._read(self.db.search_full_text, keyword, columns,
+                                limit)
+
+
+    async def get_all_genres(self) -> list[tuple]:
+        """Coroutine version of Database.get_all_genres."""
+
+        return await self._read(self.db.get_all_genres)
+
+
+    async def get_genres_by_prefix(self, prefix: str, limit: int = 10,
+                                   offset: int = 0) -> tuple[list[tuple],
+                                                             bool]:
+        """Coroutine version of Database.get_genres_by_prefix."""
+
+        return await self._read(self.db.get_genres_by_prefix, prefix, limit,
+                                offset)
+
+
+    async def fuzzy_search(self, keyword: str, limit: int = 10,
+                           threshold: float = 0.3) -> list[tuple]:
+        """Coroutine version of Database.fuzzy_search."""
+
+        return await self._read(self.db.fuzzy_search, keyword, limit,
+                                threshold)
+
+
+    async def autocomplete(self, prefix: str, limit: int = 10) -> list[str]:
+        """Coroutine version of Database.autocomplete."""
+
+        return await self._read(self.db.autocomplete, prefix, limit)
+
+
+    async def get_book_by_uid(self, uid: int) -> tuple:
+        """Coroutine version of Database.get_book_by_uid."""
+
+        return await self._read(self.db.get_book_by_uid, uid)
+
+
+    async def get_all_books(self) -> list[tuple]:
+        """Coroutine version of Database.get_all_books."""
+
+        return await self._read(self.db.get_all_books)
+
+
+    async def get_all_books_by_genre(self, genre: str) -> list[tuple]:
+        """Coroutine version of Database.get_all_books_by_genre."""
+
+        return await self._read(self.db.get_all_books_by_genre, genre)
+
+
+    async def get_books_page(self, page_size: int = 10, after_uid: int = None,
+                             before_uid: int = None, genre: str = None,
+                             keyword: str = None, sort_by: str = 'id',
+                             descending: bool = False,
+                             sort_value: object = None) -> BooksPage:
+        """Coroutine version of Database.get_books_page."""
+
+        return await self._read(self.db.get_books_page, page_size, after_uid,
+                                before_uid, genre, keyword, sort_by,
+                                descending, sort_value)
+
+
+    async def get_last_book_added(self) -> tuple:
+        """Coroutine version of Database.get_last_book_added."""
+
+        return await self._read(self.db.get_last_book_added)
+
+
+    async def get_amount_of_books(self) -> int:
+        """Coroutine version of Database.get_amount_of_books."""
+
+        return await self._read(self.db.get_amount_of_books)
+
+
+    async def is_empty(self) -> bool:
+        """Coroutine version of Database.is_empty."""
+
+        return await self._read(self.db.is_empty)
+
+
+    async def get_amount_of_books_by_genre(self, genre: str) -> int:
+        """Coroutine version of Database.get_amount_of_books_by_genre."""
+
+        return await self._read(self.db.get_amount_of_books_by_genre, genre)
+
+
+    async def get_statistics(self) -> dict:
+        """Coroutine version of Database.get_statistics."""
+
+        return await self._read(self.db.get_statistics)
+
+
+    async def get_changes(self, since_seq: int = 0,
+                          limit: int = 1000) -> list[tuple]:
+        """Coroutine version of Database.get_changes."""
+
+        return await self._read(self.db.get_changes, since_seq, limit)
+
+
+    async def add_new_genres(self, genres: list[str],
+                             silent: bool = False) -> None:
+        """Coroutine version of Database.add_new_genres."""
+
+        return await self._write(self.db.add_new_genres, genres, silent)
+
+
+    async def add_new_book(self, book: Book) -> int:
+        """Coroutine version of Database.add_new_book, committed at once."""
+
+        return await self._write(self.db.add_new_book, book)
+
+
+    async def add_new_books(self, books: list[Book]) -> int:
+        """Coroutine version of Database.add_new_books, committed at once."""
+
+        return await self._write(self.db.add_new_books, books)
+
+
+    async def delete_book(self, uid: int) -> int:
+        """Coroutine version of Database.delete_book, committed at once."""
+
+        return await self._write(self.db.delete_book, uid)
+
+
+    async def iter_books(self, genre: str = None, keyword: str = None,
+                         batch_size: int = 1000,
+                         prefetch: int = 2) -> AsyncIterator[tuple]:
+        """
+        Asynchronously iterates over books, see Database.iter_books.
+
+        Args:
+        genre (str): Only books of this genre.
+        keyword (str): Only books matching this search keyword.
+        batch_size (int): Amount of books passed from the reader thread to
+        the event loop at once.
+        prefetch (int): Maximum amount of batches read ahead of the consumer.
+
+        Yields:
+        tuple: Book records one by one.
+
+        Behavior:
+        The reader thread stops fetching while prefetch batches are waiting
+        to be consumed, so a slow consumer never makes the result set pile
+        up in memory. Leaving the loop early (break, cancellation) stops the
+        reader thread.
+        """
+
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        free_slots = threading.Semaphore(prefetch)
+        stop = threading.Event()
+
+        def put(item) -> bool:
+            while not stop.is_set():
+                if free_slots.acquire(timeout=0.1):
+                    loop.call_soon_threadsafe(queue.put_nowait, item)
+                    return True
+            return False
+
+        def produce() -> None:
+            books = self.db.iter_books(genre, keyword, batch_size)
+            try:
+                batch = []
+                for book in books:
+                    batch.append(book)
+                    if len(batch) == batch_size:
+                        if not put(batch):
+                            return
+                        batch = []
+                if batch and not put(batch):
+                    return
+                put(None)
+            except Exception as error:
+                put(error)
+            finally:
+                books.close()
+
+        async with self._pending:
+            loop.run_in_executor(self._readers, produce)
+            try:
+                while True:
+                    batch = await queue.get()
+                    free_slots.release()
+                    if batch is None:
+                        return
+                    if isinstance(batch, Exception):
+                        raise batch
+                    for book in batch:
+                        yield book
+            finally:
+                stop.set()
+
+
+    async def close(self) -> None:
+        """Waits for submitted calls to finish and closes all connections."""
+
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, functools.partial(
+            self._readers.shutdown, wait=True))
+        await loop.run_in_executor(None, functools.partial(
+            self._writer.shutdown, wait=True))
+        self.db.close_connection()
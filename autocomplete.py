@@ -0,0 +1,159 @@
+"""Prefix completion of book titles and authors"""
+import bisect
+import heapq
+import threading
+from typing import Iterable
+
+import fuzzy
+
+
+class PrefixIndex:
+    """
+    Thread-safe index completing the beginnings of titles and authors.
+
+    Every distinct text is kept once, under its normalized form (see
+    fuzzy.normalize()), in a sorted list of strings, so the completions of
+    a prefix are one contiguous slice found by binary search. Each text
+    counts the books it belongs to, and completions are ranked by it.
+
+    Ranking a slice takes time proportional to its length, so the results of
+    prefixes matching more than SCAN_LIMIT texts (short ones such as 't')
+    are kept, updated in place when books are added and dropped when one of
+    their texts loses a book.
+    """
+
+    # Prefixes matching more texts than this get their ranking cached.
+    SCAN_LIMIT = 256
+
+    # Texts added at once beyond which the keys are re-sorted as a whole
+    # instead of being inserted one by one.
+    BULK_SIZE = 1024
+
+    def __init__(self, texts: Iterable[str] = ()) -> None:
+        """
+        Args:
+        texts (Iterable[str]): Initial texts, once per book they belong to.
+        """
+
+        self._keys = []
+        self._entries = {}
+        self._top = {}
+        self._lock = threading.Lock()
+        self.add_many(texts)
+
+
+    def __len__(self) -> int:
+
+        return len(self._keys)
+
+
+    def _rank(self, key: str) -> tuple[int, str]:
+        """Sort key of completions: most books first, then alphabetical."""
+
+        return -self._entries[key][1], key
+
+
+    def add_many(self, texts: Iterable[str]) -> None:
+        """
+        Adds texts, once per book they belong to.
+
+        Args:
+        texts (Iterable[str]): Titles and authors of added books. Empty
+        texts are skipped.
+        """
+
+        with self._lock:
+            new_keys, changed_keys = [], []
+            for text in texts:
+                if not text:
+                    continue
+                key = fuzzy.normalize(text)
+                entry = self._entries.get(key)
+                if entry is None:
+                    self._entries[key] = [text, 1]
+                    new_keys.append(key)
+                else:
+                    entry[1] += 1
+                changed_keys.append(key)
+
+            if len(new_keys) > self.BULK_SIZE:
+                self._keys.extend(new_keys)
+                self._keys.sort()
+            else:
+                for key in new_keys:
+                    bisect.insort(self._keys, key)
+
+            if len(changed_keys) > self.SCAN_LIMIT:
+                self._top.clear()
+                return
+            # A text gaining a book can only move up, so it either joins the
+            # cached rankings of its prefixes or reorders them.
+            for key in changed_keys:
+                for end in range(len(key) + 1):
+                    cached = self._top.get(key[:end])
+                    if cached is None:
+                        continue
+                    limit, top = cached
+                    if key not in top:
+                        top.append(key)
+                    top.sort(key=self._rank)
+                    del top[limit:]
+
+
+    def remove_many(self, texts: Iterable[str]) -> None:
+        """
+        Removes texts, once per book they belonged to.
+
+        Args:
+        texts (Iterable[str]): Titles and authors of deleted books. Texts
+        that are not in the index are skipped.
+        """
+
+        with self._lock:
+            for text in texts:
+                if not text:
+                    continue
+                key = fuzzy.normalize(text)
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                entry[1] -= 1
+                if entry[1] <= 0:
+                    del self._entries[key]
+                    del self._keys[bisect.bisect_left(self._keys, key)]
+                # Texts outside a cached ranking may now outrank this one.
+                for end in range(len(key) + 1):
+                    self._top.pop(key[:end], None)
+
+
+    def complete(self, prefix: str, limit: int = 10) -> list[str]:
+        """
+        Completes a prefix.
+
+        Args:
+        prefix (str): Beginning of a title or author, case and accents are
+        ignored.
+        limit (int): Maximum amount of completions.
+
+        Returns:
+        list[str]: Distinct texts starting with the prefix, those of the
+        most books first, then alphabetically. Texts differing only in case
+        or accents are returned once, as first added.
+        """
+
+        key = fuzzy.normalize(prefix)
+
+        with self._lock:
+            cached = self._top.get(key)
+            if cached is not None and cached[0] >= limit:
+                top = cached[1][:limit]
+            else:
+                start = bisect.bisect_left(self._keys, key)
+                end = bisect.bisect_left(self._keys, f'{key}\U0010ffff',
+                                         start)
+                top = heapq.nsmallest(limit, self._keys[start:end],
+                                      key=self._rank)
+                if end - start > self.SCAN_LIMIT:
+                    self._top[key] = (limit, top[:])
+
+            return [self._entries[key][0] for key in top]
@@ -0,0 +1,292 @@
+"""Online snapshots of the Library database through the SQLite backup API"""
+import datetime
+import os
+import re
+import sqlite3
+import time
+
+# Pages copied per backup step. The source is only read-locked while a step
+# runs, so other connections read and write the database in between.
+STEP_PAGES = 1024
+
+# Seconds slept after every backup step, leaving the database to other
+# connections.
+STEP_SLEEP = 0.005
+
+# Restarts after which the remaining pages are copied in a single step. A
+# backup restarts whenever another connection writes to the source, so
+# under steady writes a throttled backup would never finish.
+MAX_RESTARTS = 3
+
+# Amount of snapshots kept by create_snapshot().
+SNAPSHOT_KEEP = 5
+
+SNAPSHOT_TIME_FORMAT = '%Y%m%d-%H%M%S-%f'
+
+
+class _TooManyRestarts(Exception):
+    """Aborts a throttled backup that keeps being restarted."""
+
+
+class StepProgress:
+    """
+    Progress callback of sqlite3.Connection.backup() counting the copied
+    pages and sleeping after every step.
+    """
+
+    def __init__(self, sleep: float, max_restarts: int = None) -> None:
+        """
+        Args:
+        sleep (float): Seconds to sleep after every step.
+        max_restarts (int): If given, the backup is aborted with
+        _TooManyRestarts after so many restarts.
+        """
+
+        self.sleep = sleep
+        self.max_restarts = max_restarts
+        self.steps = 0
+        self.restarts = 0
+        self.copied = 0
+        self.total = 0
+        self._remaining = None
+
+
+    def __call__(self, status: int, remaining: int, total: int) -> None:
+
+        self.steps += 1
+        if self._remaining is None or remaining >= self._remaining:
+            if self._remaining is not None:
+                # The source was written to and the copy started over.
+                self.restarts += 1
+            self.copied += total - remaining
+        else:
+            self.copied += self._remaining - remaining
+        self._remaining = remaining
+        self.total = total
+
+        if self.max_restarts is not None and \
+                self.restarts > self.max_restarts:
+            raise _TooManyRestarts()
+        if remaining and self.sleep:
+            time.sleep(self.sleep)
+
+
+def copy_database(source: sqlite3.Connection, target: sqlite3.Connection,
+                  pages: int = STEP_PAGES,
+                  sleep: float = STEP_SLEEP) -> dict:
+    """
+    Copies a whole database into another one while the source stays in use.
+
+    Args:
+    source (sqlite3.Connection): Connection to the copied database, without
+    an open write transaction.
+    target (sqlite3.Connection): Connection to the overwritten database.
+    pages (int): Pages copied per step, -1 copies everything at once.
+    sleep (float): Seconds to sleep after every step.
+
+    Returns:
+    dict: {'pages': int, 'bytes': int, 'steps': int, 'restarts': int,
+    'seconds': float, 'pages_per_second': float}, where pages is the size
+    of the copy, restarts the amount of times writes of other connections
+    made the copy start over and pages_per_second counts every copied page,
+    the ones copied again included, over the whole time with sleeps.
+
+    Behavior:
+    Writes made through the source connection itself are applied to the
+    copy as it goes. After MAX_RESTARTS restarts caused by other
+    connections, the remaining pages are copied in a single step.
+    """
+
+    progress = StepProgress(sleep, MAX_RESTARTS)
+    start = time.perf_counter()
+    try:
+        source.backup(target, pages=pages, progress=progress,
+                      sleep=max(sleep, 0.001))
+    except _TooManyRestarts:
+        finish = StepProgress(0)
+        source.backup(target, progress=finish)
+        progress.steps += finish.steps
+        progress.copied += finish.copied
+        progress.total = finish.total
+    seconds = time.perf_counter() - start
+
+    page_size = target.execute('PRAGMA page_size').fetchone()[0]
+
+    return {'pages': progress.total,
+            'bytes': progress.total * page_size,
+            'steps': progress.steps,
+            'restarts': progress.restarts,
+            'seconds': seconds,
+            'pages_per_second': progress.copied / seconds if seconds else 0.0}
+
+
+def check_integrity(path: str) -> list[str]:
+    """
+    Checks a database file, e.g. a snapshot, without changing it.
+
+    Args:
+    path (str): Path of the database file.
+
+    Returns:
+    list[str]: Problems found by PRAGMA integrity_check, empty if there are
+    none.
+
+    Raises:
+    LookupError: If there is no such file.
+    """
+
+    if not os.path.isfile(path):
+        raise LookupError(f'No database file {path}')
+
+    connection = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    try:
+        problems = [row[0] for row in
+                    connection.execute('PRAGMA integrity_check')]
+    except sqlite3.DatabaseError as error:
+        problems = [str(error)]
+    finally:
+        connection.close()
+
+    return [] if problems == ['ok'] else problems
+
+
+def list_snapshots(directory: str, name: str) -> list[str]:
+    """
+    Lists the snapshots of a database.
+
+    Args:
+    directory (str): Directory of the snapshots.
+    name (str): Name of the database file without its extension.
+
+    Returns:
+    list[str]: Paths of the snapshots, oldest first.
+    """
+
+    if not os.path.isdir(directory):
+        return []
+
+    pattern = re.compile(rf'{re.escape(name)}-\d{{8}}-\d{{6}}-\d{{6}}\.db')
+
+    return [os.path.join(directory, file_name)
+            for file_name in sorted(os.listdir(directory))
+            if pattern.fullmatch(file_name)]
+
+
+def rotate_snapshots(directory: str, name: str, keep: int) -> list[str]:
+    """
+    Deletes the oldest snapshots of a database beyond the newest ones.
+
+    Args:
+    directory (str): Directory of the snapshots.
+    name (str): Name of the database file without its extension.
+    keep (int): Amount of snapshots to keep.
+
+    Returns:
+    list[str]: Paths of the deleted snapshots.
+    """
+
+    snapshots = list_snapshots(directory, name)
+    removed = snapshots[:max(len(snapshots) - keep, 0)]
+    for path in removed:
+        os.remove(path)
+
+    return removed
+
+
+def create_snapshot(source: sqlite3.Connection, directory: str, name: str,
+                    keep: int = SNAPSHOT_KEEP, pages: int = STEP_PAGES,
+                    sleep: float = STEP_SLEEP) -> dict:
+    """
+    Takes a checked snapshot of a live database and rotates the old ones.
+
+    Args:
+    source (sqlite3.Connection): Connection to the database, without an
+    open write transaction.
+    directory (str): Directory of the snapshots, created if missing.
+    name (str): Name of the database file without its extension.
+    keep (int): Amount of snapshots to keep, this one included.
+    pages (int): Pages copied per step, -1 copies everything at once.
+    sleep (float): Seconds to sleep after every step.
+
+    Returns:
+    dict: copy_database() report with the 'path' of the snapshot and the
+    paths of the 'removed' ones.
+
+    Raises:
+    ValueError: If the copy fails the integrity check. No snapshot is kept
+    and none is removed then.
+
+    Behavior:
+    The copy is written next to the snapshots under a .part name and only
+    renamed to {name}-{timestamp}.db after passing the integrity check, so
+    every listed snapshot is complete. Snapshots use the rollback journal
+    instead of WAL, so each of them is one self-contained file.
+    """
+
+    os.makedirs(directory, exist_ok=True)
+    timestamp = datetime.datetime.now().strftime(SNAPSHOT_TIME_FORMAT)
+    path = os.path.join(directory, f'{name}-{timestamp}.db')
+    part_path = f'{path}.part'
+
+    try:
+        target = sqlite3.connect(part_path)
+        try:
+            report = copy_database(source, target, pages, sleep)
+            target.execute('PRAGMA journal_mode = DELETE').fetchall()
+        finally:
+            target.close()
+
+        problems = check_integrity(part_path)
+        if problems:
+            raise ValueError(f'Snapshot of {name} failed the integrity '
+                             f'check: {"; ".join(problems[:10])}')
+        os.replace(part_path, path)
+    finally:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+
+    report['path'] = path
+    report['removed'] = rotate_snapshots(directory, name, keep)
+
+    return report
+
+
+def restore_snapshot(path: str, target: sqlite3.Connection,
+                     pages: int = -1, sleep: float = 0.0) -> dict:
+    """
+    Replaces the content of a database with a snapshot.
+
+    Args:
+    path (str): Path of the snapshot.
+    target (sqlite3.Connection): Connection to the overwritten database,
+    without an open transaction.
+    pages (int): Pages copied per step, -1 copies everything at once.
+    sleep (float): Seconds to sleep after every step.
+
+    Returns:
+    dict: copy_database() report with the 'path' of the snapshot.
+
+    Raises:
+    LookupError: If there is no such snapshot.
+    ValueError: If the snapshot fails the integrity check. The database is
+    left untouched then.
+
+    Behavior:
+    The copy is committed as a whole, so other connections see either the
+    old content or the snapshot.
+    """
+
+    problems = check_integrity(path)
+    if problems:
+        raise ValueError(f'Snapshot {path} failed the integrity check: '
+                         f'{"; ".join(problems[:10])}')
+
+    source = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    try:
+        report = copy_database(source, target, pages, sleep)
+    finally:
+        source.close()
+
+    report['path'] = path
+
+    return report
@@ -0,0 +1,47 @@
+"""A unit of work grouping Database writes into one transaction"""
+
+class WriteBatch:
+    """
+    Collects the results of writes made inside Database.batch(), so callers
+    can confirm them without reading the books back.
+    """
+
+    def __init__(self, db) -> None:
+
+        self.db = db
+        self.added_uids = []
+        self.deleted_amount = 0
+
+
+    def add_book(self, book) -> int:
+        """
+        Add a new book as part of the batch.
+
+        Args:
+        book (Book): The book to add.
+
+        Returns:
+        int: UID of the added book.
+        """
+
+        uid = self.db.add_new_book(book)
+        self.added_uids.append(uid)
+
+        return uid
+
+
+    def delete_book(self, uid: int) -> bool:
+        """
+        Delete a book as part of the batch.
+
+        Args:
+        uid (int): The unique identifier of the book to delete.
+
+        Returns:
+        bool: True if the book existed and was deleted, False otherwise.
+        """
+
+        deleted_amount = self.db.delete_book(uid)
+        self.deleted_amount += deleted_amount
+
+        return deleted_amount > 0
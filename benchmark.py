@@ -0,0 +1,253 @@
+"""This file represents a benchmark suite for the Library database"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from book import Book
+from db import Database
+import db_templates
+
+
+TITLE_WORDS = ['Shadow', 'Empire', 'Garden', 'Winter', 'Secret', 'River',
+               'Crown', 'Storm', 'Glass', 'Silent', 'Iron', 'Moon', 'House',
+               'Last', 'Forgotten', 'City', 'Dragon', 'Letter', 'Night',
+               'Journey', 'Stone', 'Fire', 'Ocean', 'Queen', 'Clockwork']
+FIRST_NAMES = ['Anna', 'John', 'Maria', 'Peter', 'Olga', 'James', 'Lena',
+               'Oscar', 'Irene', 'Victor', 'Sofia', 'Marek', 'Elena', 'Tom']
+LAST_NAMES = ['Smith', 'Novak', 'Garcia', 'Kowalski', 'Ivanova', 'Brown',
+              'Rossi', 'Muller', 'Dubois', 'Tanaka', 'Silva', 'Berg']
+DESCRIPTION_WORDS = ['a', 'story', 'about', 'love', 'war', 'family',
+                     'mystery', 'friendship', 'betrayal', 'adventure',
+                     'memory', 'loss', 'hope', 'the', 'of', 'and']
+
+
+def generate_books(amount: int, seed: int = 0):
+    """
+    Deterministically generates synthetic books.
+
+    Args:
+    amount (int): Amount of books to generate.
+    seed (int): Seed of the random generator; equal seeds give equal books.
+
+    Yields:
+    Book: Generated books with genres from db_templates.initial_genres.
+    """
+
+    generator = random.Random(seed)
+    for _ in range(amount):
+        title = ' '.join(generator.choices(TITLE_WORDS,
+                                           k=generator.randint(1, 4)))
+        author = (f'{generator.choice(FIRST_NAMES)} '
+                  f'{generator.choice(LAST_NAMES)}')
+        description = ' '.join(generator.choices(DESCRIPTION_WORDS,
+                                                 k=generator.randint(5, 30)))
+        genre = generator.choice(db_templates.initial_genres)
+        yield Book(title, author, description, genre,
+                   generator.randint(20, 1500))
+
+
+def generate_catalog(db: Database, amount: int, seed: int = 0,
+                     chunk_size: int = 10000) -> None:
+    """
+    Fills a database with synthetic books.
+
+    Args:
+    db (Database): Database to fill.
+    amount (int): Amount of books to add.
+    seed (int): Seed of the random generator.
+    chunk_size (int): Amount of books committed at once.
+    """
+
+    books = generate_books(amount, seed)
+    for _ in range(0, amount, chunk_size):
+        with db.batch():
+            db.add_new_books(itertools.islice(books, chunk_size))
+
+
+def measure(function, repeats: int) -> dict:
+    """
+    Runs a function several times and summarizes its run time.
+
+    Args:
+    function: Callable without arguments.
+    repeats (int): Amount of runs.
+
+    Returns:
+    dict: {'median': float, 'min': float, 'max': float, 'repeats': int},
+    times in seconds.
+    """
+
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+
+    return {'median': statistics.median(timings), 'min': min(timings),
+            'max': max(timings), 'repeats': repeats}
+
+
+def run_benchmarks(path: str, size: int, repeats: int, seed: int) -> dict:
+    """
+    Runs every benchmark against a catalog of the given size.
+
+    Args:
+    path (str): Path of the generated database file.
+    size (int): Amount of books in the catalog.
+    repeats (int): Amount of runs of every benchmark.
+    seed (int): Seed of the random generators.
+
+    Returns:
+    dict: Benchmark name mapped to its timing summary.
+    """
+
+    from main import Library
+
+    db = Database(path, cache_size=0)
+    generator = random.Random(seed)
+    uids = [generator.randint(1, size) for _ in range(100)]
+    keywords = generator.choices(TITLE_WORDS + LAST_NAMES, k=10)
+    genres = db_templates.initial_genres
+    library = Library(db)
+    results = {}
+
+    results['startup'] = measure(
+        lambda: Database(path, cache_size=0).close_connection(), repeats)
+    results['search'] = measure(
+        lambda: [db.search(keyword) for keyword in keywords], repeats)
+    results['fuzzy_search'] = measure(
+        lambda: [db.fuzzy_search(keyword[:-1]) for keyword in keywords],
+        repeats)
+    db.autocomplete('')
+    results['autocomplete'] = measure(
+        lambda: [db.autocomplete(keyword[:length]) for keyword in keywords
+                 for length in range(1, 5)], repeats)
+    results['get_all_books_by_genre'] = measure(
+        lambda: [db.get_all_books_by_genre(genre) for genre in genres],
+        repeats)
+    results['get_book_by_uid'] = measure(
+        lambda: [db.get_book_by_uid(uid) for uid in uids], repeats)
+    results['get_books_page'] = measure(
+        lambda: str(library._create_table_page(db.get_books_page(
+            library.BOOKS_PER_PAGE, genre=genres[0]).books)), repeats)
+
+    genre_books = db.get_all_books_by_genre(genres[0])
+    for renderer in Library.RENDERERS:
+        renderer_library = Library(db, renderer=renderer)
+        results[f'create_table_pages_{renderer}'] = measure(
+            lambda: [str(page) for page
+                     in renderer_library._create_table_pages(genre_books)],
+            repeats)
+
+    added_uids = []
+
+    def add_books():
+        for book in generate_books(100, seed + 1):
+            added_uids.append(db.add_new_book(book))
+            db.commit_changes()
+
+    results['add_new_book'] = measure(add_books, repeats)
+    with db.batch() as batch:
+        for uid in added_uids:
+            batch.delete_book(uid)
+
+    db.close_connection()
+
+    return results
+
+
+def compare(old_path: str, new_path: str, threshold: float) -> bool:
+    """
+    Compares two benchmark result files and prints the differences.
+
+    Args:
+    old_path (str): Baseline results.
+    new_path (str): New results.
+    threshold (float): Relative slowdown of the median above which a
+    benchmark is flagged as a regression (0.2 means 20% slower).
+
+    Returns:
+    bool: True if any benchmark regressed.
+    """
+
+    with open(old_path, encoding='utf-8') as file:
+        old_results = json.load(file)['results']
+    with open(new_path, encoding='utf-8') as file:
+        new_results = json.load(file)['results']
+
+    regressed = False
+    for size, benchmarks in new_results.items():
+        for name, timing in benchmarks.items():
+            old_timing = old_results.get(size, {}).get(name)
+            if old_timing is None:
+                continue
+            ratio = timing['median'] / old_timing['median']
+            flag = ''
+            if ratio > 1 + threshold:
+                flag, regressed = 'REGRESSION', True
+            print(f'{size:>9} {name:<32} {old_timing["median"]:>10.6f}s '
+                  f'{timing["median"]:>10.6f}s {ratio:>7.2f}x {flag}')
+
+    return regressed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Benchmark the Library database on synthetic catalogs.')
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[10000, 100000],
+                        help='catalog sizes (default: 10000 100000)')
+    parser.add_argument('--repeats', type=int, default=5,
+                        help='runs of every benchmark (default: 5)')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed of the catalog generator (default: 0)')
+    parser.add_argument('--output', default='benchmark.json',
+                        help='results file (default: benchmark.json)')
+    parser.add_argument('--workdir',
+                        help='directory for the generated databases '
+                             '(default: a temporary directory)')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'),
+                        help='compare two results files instead of running')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='slowdown flagged as regression (default: 0.2)')
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(1 if compare(*args.compare, args.threshold) else 0)
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='library-benchmark-')
+    report = {'meta': {'python': platform.python_version(),
+                       'sqlite': sqlite3.sqlite_version,
+                       'platform': platform.platform(),
+                       'seed': args.seed,
+                       'repeats': args.repeats,
+                       'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S')},
+              'results': {}}
+
+    for size in args.sizes:
+        path = os.path.join(workdir, f'catalog-{size}-{args.seed}.db')
+        db = Database(path, cache_size=0)
+        if db.get_amount_of_books() != size:
+            db.close_connection()
+            for suffix in ['', '-wal', '-shm']:
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+            db = Database(path, cache_size=0)
+            print(f'Generating {size} books into {path}')
+            generate_catalog(db, size, args.seed)
+        db.close_connection()
+
+        print(f'Benchmarking {size} books')
+        report['results'][str(size)] = run_benchmarks(path, size,
+                                                      args.repeats, args.seed)
+
+    with open(args.output, 'w', encoding='utf-8') as file:
+        json.dump(report, file, indent=2)
+    print(f'Results written to {args.output}')
@@ -1,12 +1,159 @@
 """A book class for Library"""
+from array import array
 
 class Book:
-    
+    """
+    Immutable book record. Attributes follow the column order of the books
+    table, so a book converts to and from database rows.
+    """
+
+    __slots__ = ('id', 'title', 'author', 'description', 'genre',
+                 'amount_of_pages')
+
     def __init__(self, title: str, author: str, description: str,
-                 genre: str, amount_of_pages: int) -> None:
-        
-        self.title = title
-        self.author = author
-        self.description = description
-        self.genre = genre
-        self.amount_of_pages = amount_of_pages
+                 genre: str, amount_of_pages: int, id: int = None) -> None:
+
+        for name, value in zip(self.__slots__, (id, title, author,
+                                                description, genre,
+                                                amount_of_pages)):
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value) -> None:
+        raise AttributeError(f'Book is immutable, cannot set {name}')
+
+    def __delattr__(self, name) -> None:
+        raise AttributeError(f'Book is immutable, cannot delete {name}')
+
+    def __iter__(self):
+        return iter(self.as_row())
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Book):
+            return NotImplemented
+        return self.as_row() == other.as_row()
+
+    def __hash__(self) -> int:
+        return hash(self.as_row())
+
+    def __repr__(self) -> str:
+        return (f'Book(id={self.id!r}, title={self.title!r}, '
+                f'author={self.author!r}, genre={self.genre!r})')
+
+    @classmethod
+    def from_row(cls, row: tuple) -> 'Book':
+        """
+        Creates a book out of a database row.
+
+        Args:
+        row (tuple): (UID: int, title: str, author: str, description: str,
+        genre: str, amount_of_pages: int)
+
+        Returns:
+        Book: The book stored in the row.
+        """
+
+        uid, title, author, description, genre, amount_of_pages = row
+
+        return cls(title, author, description, genre, amount_of_pages, uid)
+
+    def as_row(self) -> tuple:
+        """
+        Converts the book into a database row.
+
+        Returns:
+        tuple: (UID: int, title: str, author: str, description: str,
+        genre: str, amount_of_pages: int)
+        """
+
+        return (self.id, self.title, self.author, self.description,
+                self.genre, self.amount_of_pages)
+
+
+class BookColumns:
+    """
+    Column-oriented collection of books for large result sets.
+
+    Instead of one object per book, every field is kept in its own parallel
+    sequence: UIDs and page counts in typed arrays, genres as small codes
+    into a list of distinct genre names, and the text fields in plain lists.
+    """
+
+    __slots__ = ('ids', 'titles', 'authors', 'descriptions', 'genre_codes',
+                 'genre_names', '_genre_index', 'amounts_of_pages')
+
+    def __init__(self) -> None:
+
+        self.ids = array('q')
+        self.titles = []
+        self.authors = []
+        self.descriptions = []
+        self.genre_codes = array('I')
+        self.genre_names = []
+        self._genre_index = {}
+        self.amounts_of_pages = array('i')
+
+    @classmethod
+    def from_rows(cls, rows) -> 'BookColumns':
+        """
+        Builds the columns out of database rows, consuming them lazily.
+
+        Args:
+        rows: Iterable of book rows in database column order.
+
+        Returns:
+        BookColumns: Columns holding all the rows.
+        """
+
+        columns = cls()
+        for row in rows:
+            columns.append(row)
+
+        return columns
+
+    def append(self, row: tuple) -> None:
+        """
+        Appends a database row (or a Book) to the columns.
+
+        Args:
+        row (tuple): (UID: int, title: str, author: str, description: str,
+        genre: str, amount_of_pages: int)
+        """
+
+        uid, title, author, description, genre, amount_of_pages = row
+
+        genre_code = self._genre_index.get(genre)
+        if genre_code is None:
+            genre_code = self._genre_index[genre] = len(self.genre_names)
+            self.genre_names.append(genre)
+
+        self.ids.append(uid)
+        self.titles.append(title)
+        self.authors.append(author)
+        self.descriptions.append(description)
+        self.genre_codes.append(genre_code)
+        self.amounts_of_pages.append(amount_of_pages)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __getitem__(self, index: int) -> Book:
+        return Book(self.titles[index], self.authors[index],
+                    self.descriptions[index],
+                    self.genre_names[self.genre_codes[index]],
+                    self.amounts_of_pages[index], self.ids[index])
+
+    def rows(self):
+        """
+        Lazily iterates over the books as database rows.
+
+        Yields:
+        tuple: (UID: int, title: str, author: str, description: str,
+        genre: str, amount_of_pages: int)
+        """
+
+        genre_names = self.genre_names
+        for uid, title, author, description, genre_code, pages in zip(
+                self.ids, self.titles, self.authors, self.descriptions,
+                self.genre_codes, self.amounts_of_pages):
+            yield (uid, title, author, description, genre_names[genre_code],
+                   pages)
@@ -0,0 +1,120 @@
+"""A bounded LRU cache for Database lookups"""
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    Thread-safe least-recently-used cache invalidated by a generation
+    counter.
+
+    Every entry remembers the generation it was loaded in. invalidate()
+    only bumps the counter, which makes all older entries stale at once;
+    they are dropped lazily when looked up or evicted.
+
+    Besides the amount of entries, the cache bounds the total amount of
+    rows it holds: a list counts as many rows as it has items, any other
+    value as one. Lists longer than max_rows are not cached at all.
+    """
+
+    def __init__(self, max_size: int = 1024, max_rows: int = 65536) -> None:
+        """
+        Args:
+        max_size (int): Maximum amount of entries, 0 disables caching.
+        max_rows (int): Maximum total amount of rows of the entries.
+        """
+
+        self.max_size = max_size
+        self.max_rows = max_rows
+        self.rows = 0
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+
+    def get(self, key) -> tuple[bool, object]:
+        """
+        Looks up a key.
+
+        Args:
+        key: Hashable cache key.
+
+        Returns:
+        tuple[bool, object]: (True, value) for a fresh entry, (False, None)
+        for a missing or stale one.
+        """
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == self.generation:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, entry[1]
+
+            if entry is not None:
+                del self._entries[key]
+                self.rows -= self._rows(entry[1])
+            self.misses += 1
+            return False, None
+
+
+    def put(self, key, value, generation: int) -> None:
+        """
+        Stores a value loaded while the cache was at the given generation.
+
+        Args:
+        key: Hashable cache key.
+        value: Value to store.
+        generation (int): Generation read before the value was loaded. If
+        the cache was invalidated meanwhile, the value is not stored.
+        """
+
+        rows = self._rows(value)
+        with self._lock:
+            if generation != self.generation or self.max_size <= 0 or \
+                    rows > self.max_rows:
+                return
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self.rows -= self._rows(entry[1])
+            self._entries[key] = (generation, value)
+            self.rows += rows
+            while len(self._entries) > self.max_size or \
+                    self.rows > self.max_rows:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.rows -= self._rows(evicted)
+
+
+    @staticmethod
+    def _rows(value) -> int:
+        """Amount of rows a cached value counts for."""
+
+        return len(value) if isinstance(value, list) else 1
+
+
+    def invalidate(self) -> None:
+        """Makes every cached entry stale."""
+
+        with self._lock:
+            self.generation += 1
+
+
+    def get_stats(self) -> dict:
+        """
+        Gets cache usage statistics.
+
+        Returns:
+        dict: {'hits': int, 'misses': int, 'size': int, 'max_size': int,
+        'rows': int, 'max_rows': int, 'generation': int}
+        """
+
+        with self._lock:
+            return {'hits': self.hits,
+                    'misses': self.misses,
+                    'size': len(self._entries),
+                    'max_size': self.max_size,
+                    'rows': self.rows,
+                    'max_rows': self.max_rows,
+                    'generation': self.generation}
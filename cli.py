@@ -0,0 +1,262 @@
+"""This file represents a non-interactive command line for the Library"""
+import argparse
+import json
+import sys
+
+
+def book_to_dict(book: tuple) -> dict:
+    """Converts a book record into a JSON-ready dictionary."""
+
+    from book import Book
+
+    return dict(zip(Book.__slots__, book))
+
+
+def search(db, args) -> object:
+    """Searches books by keyword, optionally within a genre."""
+
+    if not args.keyword.strip():
+        raise ValueError('Keyword must not be empty')
+
+    if args.fuzzy:
+        books = db.fuzzy_search(args.keyword, args.limit)
+    elif args.full_text:
+        books = db.search_full_text(args.keyword, limit=args.limit)
+    elif args.genre:
+        books = db.get_books_page(args.limit, genre=args.genre,
+                                  keyword=args.keyword, sort_by='rank').books
+    else:
+        books = db.search(args.keyword, args.limit)
+
+    return [book_to_dict(book) for book in books]
+
+
+def complete(db, args) -> object:
+    """Completes the beginning of a title or author."""
+
+    return db.autocomplete(args.prefix, args.limit)
+
+
+def get(db, args) -> object:
+    """Gets a single book by its UID."""
+
+    book = db.get_book_by_uid(args.uid)
+    if not book:
+        raise LookupError(f'Book {args.uid} does not exist')
+
+    return book_to_dict(book)
+
+
+def add(db, args) -> object:
+    """Validates and adds a new book, returning its UID."""
+
+    from importer import validate_row
+
+    genres = {genre[1] for genre in db.get_all_genres()}
+    book, reason = validate_row({'title': args.title, 'author': args.author,
+                                 'description': args.description,
+                                 'genre': args.genre,
+                                 'amount_of_pages': args.pages}, genres)
+    if not book:
+        raise ValueError(reason)
+
+    with db.batch() as batch:
+        uid = batch.add_book(book)
+
+    return {'id': uid}
+
+
+def delete(db, args) -> object:
+    """Deletes a book by its UID."""
+
+    with db.batch() as batch:
+        deleted = batch.delete_book(args.uid)
+
+    return {'id': args.uid, 'deleted': deleted}
+
+
+def count(db, args) -> object:
+    """Counts all books or the books of one genre."""
+
+    if args.genre:
+        return {'genre': args.genre,
+                'amount_of_books': db.get_amount_of_books_by_genre(args.genre)}
+
+    return {'amount_of_books': db.get_amount_of_books()}
+
+
+def genres(db, args) -> object:
+    """Lists genre names, optionally starting with a prefix."""
+
+    genres, _ = db.get_genres_by_prefix(args.prefix, args.limit)
+
+    return [genre_name for _, genre_name in genres]
+
+
+def changes(db, args) -> object:
+    """Reads the change log after a sequence number."""
+
+    return [{'seq': seq, 'table': table_name, 'operation': operation,
+             'row_id': row_id, 'data': data, 'changed_at': changed_at}
+            for seq, table_name, operation, row_id, data, changed_at
+            in db.get_changes(args.since, args.limit)]
+
+
+def compact_changes(db, args) -> object:
+    """Applies the retention policy of the change log."""
+
+    return {'dropped': db.compact_changes(args.retention),
+            'last_seq': db.get_last_change_seq()}
+
+
+def backup(db, args) -> object:
+    """Takes a snapshot of the database and rotates the old ones."""
+
+    return db.backup(args.directory, args.keep, args.pages, args.sleep)
+
+
+def restore(db, args) -> object:
+    """Replaces the database with a snapshot."""
+
+    return db.restore(args.snapshot)
+
+
+def check(db, args) -> object:
+    """Checks the integrity of a snapshot."""
+
+    import backup
+
+    problems = backup.check_integrity(args.snapshot)
+
+    return {'path': args.snapshot, 'ok': not problems, 'problems': problems}
+
+
+def create_parser() -> argparse.ArgumentParser:
+    """Creates the argument parser with one subcommand per operation."""
+
+    parser = argparse.ArgumentParser(
+        description='Query and edit the Library catalog, printing JSON.')
+    parser.add_argument('--database', default='database.db',
+                        help='SQLite database file (default: database.db)')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    command = commands.add_parser('search', help='search books by keyword')
+    command.add_argument('keyword')
+    command.add_argument('--genre', help='only books of this genre')
+    command.add_argument('--full-text', action='store_true',
+                         help='also search in descriptions')
+    command.add_argument('--fuzzy', action='store_true',
+                         help='tolerate typos, most similar books first')
+    command.add_argument('--limit', type=int, default=50,
+                         help='maximum amount of books (default: 50)')
+    command.set_defaults(handler=search)
+
+    command = commands.add_parser('complete',
+                                  help='complete a title or author')
+    command.add_argument('prefix')
+    command.add_argument('--limit', type=int, default=10,
+                         help='maximum amount of completions (default: 10)')
+    command.set_defaults(handler=complete)
+
+    command = commands.add_parser('get', help='get a book by its UID')
+    command.add_argument('uid', type=int)
+    command.set_defaults(handler=get)
+
+    command = commands.add_parser('add', help='add a new book')
+    command.add_argument('--title', required=True)
+    command.add_argument('--author', required=True)
+    command.add_argument('--description', default='')
+    command.add_argument('--genre', required=True)
+    command.add_argument('--pages', type=int, required=True)
+    command.set_defaults(handler=add)
+
+    command = commands.add_parser('delete', help='delete a book by its UID')
+    command.add_argument('uid', type=int)
+    command.set_defaults(handler=delete)
+
+    command = commands.add_parser('count', help='count books')
+    command.add_argument('--genre', help='only books of this genre')
+    command.set_defaults(handler=count)
+
+    command = commands.add_parser('genres', help='list genres')
+    command.add_argument('--prefix', default='',
+                         help='only genres starting with it')
+    command.add_argument('--limit', type=int, default=1000,
+                         help='maximum amount of genres (default: 1000)')
+    command.set_defaults(handler=genres)
+
+    command = commands.add_parser('changes',
+                                  help='read changes after a sequence number')
+    command.add_argument('--since', type=int, default=0,
+                         help='last applied change (default: 0)')
+    command.add_argument('--limit', type=int, default=1000,
+                         help='maximum amount of changes (default: 1000)')
+    command.set_defaults(handler=changes)
+
+    command = commands.add_parser('compact-changes',
+                                  help='drop changes past their retention')
+    command.add_argument('--retention', type=float,
+                         help='seconds of changes kept whole '
+                              '(default: 7 days)')
+    command.set_defaults(handler=compact_changes)
+
+    command = commands.add_parser('backup',
+                                  help='snapshot the database while in use')
+    command.add_argument('--directory',
+                         help='directory of the snapshots (default: backups '
+                              'next to the database)')
+    command.add_argument('--keep', type=int, default=5,
+                         help='amount of snapshots to keep (default: 5)')
+    command.add_argument('--pages', type=int, default=1024,
+                         help='pages copied per step (default: 1024)')
+    command.add_argument('--sleep', type=float, default=0.005,
+                         help='seconds to sleep between steps '
+                              '(default: 0.005)')
+    command.set_defaults(handler=backup)
+
+    command = commands.add_parser('restore',
+                                  help='replace the database with a snapshot')
+    command.add_argument('snapshot')
+    command.set_defaults(handler=restore)
+
+    command = commands.add_parser('check',
+                                  help='check the integrity of a snapshot')
+    command.add_argument('snapshot')
+    command.set_defaults(handler=check)
+
+    return parser
+
+
+def main(argv: list[str] = None) -> int:
+    """
+    Runs one subcommand and prints its result as JSON.
+
+    Args:
+    argv (list[str]): Command line arguments (default is sys.argv[1:]).
+
+    Returns:
+    int: Exit status, 0 on success and 1 if the command failed. Errors are
+    printed to stderr as {"error": "..."}.
+    """
+
+    args = create_parser().parse_args(argv)
+
+    from db import Database
+
+    db = Database(args.database, cache_size=0)
+    try:
+        result = args.handler(db, args)
+    except (LookupError, ValueError) as error:
+        print(json.dumps({'error': str(error)}), file=sys.stderr)
+        return 1
+    finally:
+        db.close_connection()
+
+    json.dump(result, sys.stdout, ensure_ascii=False)
+    sys.stdout.write('\n')
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,18 +1,216 @@
+import contextlib
+import functools
+import math
+import os
+import re
 import sqlite3
-from book import Book
+import threading
+from itertools import chain
+from typing import Iterable, Iterator
+from autocomplete import PrefixIndex
+from batch import WriteBatch
+from book import Book, BookColumns
+from cache import LRUCache
+from page import BooksPage
 import db_templates
+import fuzzy
+import migrations
+
+
+def book_factory(cursor: sqlite3.Cursor, row: tuple) -> Book:
+    """Row factory building Book objects out of books_view rows."""
+
+    return Book.from_row(row)
+
+
+def cached_lookup(method):
+    """
+    Decorator serving a Database read method from the database's LRU cache.
+
+    The cache key is the method name and its arguments. Lists are copied
+    on the way out, so callers can never modify a cached result.
+    """
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        key = (method.__name__,
+               *(tuple(arg) if isinstance(arg, list) else arg
+                 for arg in args),
+               *sorted((name, tuple(value) if isinstance(value, list)
+                        else value) for name, value in kwargs.items()))
+        generation = self._cache.generation
+        hit, result = self._cache.get(key)
+        if not hit:
+            result = method(self, *args, **kwargs)
+            self._cache.put(key, result, generation)
+
+        return list(result) if isinstance(result, list) else result
+
+    return wrapper
 
 
 class Database():
 
-    def __init__(self):
+    INSTRUMENTED_METHODS = ['add_new_genres', 'search', 'search_full_text',
+                            'get_all_genres', 'get_genres_by_prefix',
+                            'delete_book', 'add_new_book',
+                            'add_new_books', 'fuzzy_search', 'autocomplete',
+                            'get_book_by_uid',
+                            'get_all_books', 'get_all_books_by_genre',
+                            'get_books_columns', 'get_books_page',
+                            'get_last_book_added', 'get_amount_of_books',
+                            'is_empty', 'get_amount_of_books_by_genre',
+                            'get_statistics', 'get_changes',
+                            'compact_changes', 'backup', 'restore',
+                            'commit_changes', 'rollback_changes']
+
+    # Maximum amount of trigram index entries read by fuzzy_search(); the
+    # most common keyword trigrams are left out of the lookup beyond it.
+    FUZZY_LOOKUP_BUDGET = 50000
+
+    # Seconds during which every logged change is kept; compact_changes()
+    # reduces older ones to the last change of every row.
+    CHANGE_RETENTION = 7 * 24 * 60 * 60
+
+    # Sort name mapped to the sorted SQL expression (None for the UID column)
+    # and the index of its value in book rows (None if book rows do not
+    # hold it). Text columns are sorted case-insensitively; genre names are
+    # unique, so they sort as stored. 'rank' is the relevance of keyword
+    # searches, best match first, and falls back to the UID elsewhere.
+    SORT_COLUMNS = {'id': (None, 0),
+                    'title': ('books.title COLLATE NOCASE', 1),
+                    'author': ('books.author COLLATE NOCASE', 2),
+                    'genre': ('books.genre', 4),
+                    'pages': ('books.amount_of_pages', 5),
+                    'rank': ('books_fts.rank', None)}
+
+    def __init__(self, database_name: str = 'database.db',
+                 pooled: bool = False, pragmas: dict = None,
+                 cache_size: int = 1024, stats: 'QueryStats' = None):
+        """
+        Opens the database and applies the schema migrations it has not
+        been through yet (see migrations.py). A database that is already
+        up to date is only opened.
+
+        Args:
+        database_name (str): Path of the SQLite database file.
+        pooled (bool): If True, every thread gets its own connection and
+        cursor, so the object can be shared by several threads. Otherwise a
+        single connection is used, as sqlite3 allows, from one thread only.
+        pragmas (dict): PRAGMA values overriding db_templates.default_pragmas
+        (journal_mode, synchronous, cache_size, mmap_size, busy_timeout...),
+        applied to every opened connection.
+        cache_size (int): Maximum amount of lookup results kept in the LRU
+        cache, 0 disables caching. The cached results also hold at most
+        LRUCache.max_rows books in total, and bigger results (e.g. a whole
+        genre) are not cached. The cache only sees writes made through
+        this object, so it should be disabled when other processes write
+        to the same database file. The same holds for the autocomplete()
+        index.
+        stats (QueryStats): If given (see instrumentation.py), calls of the
+        INSTRUMENTED_METHODS and the SQL they run are recorded into it.
+        Without it the methods are not wrapped, so instrumentation costs
+        nothing when disabled.
+        """
+
+        self.database_name = database_name
+        self.pooled = pooled
+        self.pragmas = {**db_templates.default_pragmas, **(pragmas or {})}
+        self._local = threading.local()
+        self._pool = []
+        self._pool_lock = threading.Lock()
+        self._cache = LRUCache(cache_size)
+        self._prefix_index = None
+        self._prefix_index_lock = threading.Lock()
+        self.stats = stats
+
+        migrations.migrate(self.connection)
+
+        if stats is not None:
+            for name in self.INSTRUMENTED_METHODS:
+                setattr(self, name, stats.wrap(self, name,
+                                               getattr(self, name)))
+
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """Connection of the calling thread, opened on first use."""
+
+        return self._thread_connection()[0]
+
+
+    @property
+    def cursor(self) -> sqlite3.Cursor:
+        """Shared cursor of the calling thread's connection."""
+
+        return self._thread_connection()[1]
+
 
-        DATABASE_NAME = 'database.db'
-        self.connection = sqlite3.connect(DATABASE_NAME)
-        self.cursor = self.connection.cursor()
-        self.cursor.execute(db_templates.books_table)
-        self.cursor.execute(db_templates.genres_table)
-        self.add_new_genres(db_templates.initial_genres, True)
+    def _thread_connection(self) -> tuple[sqlite3.Connection,
+                                          sqlite3.Cursor]:
+        """
+        Gets the connection and cursor of the calling thread.
+
+        Returns:
+        tuple[sqlite3.Connection, sqlite3.Cursor]: In pooled mode a
+        connection of the calling thread, opened on first use. Otherwise
+        the single connection of the database.
+        """
+
+        try:
+            return self._local.connection, self._local.cursor
+        except AttributeError:
+            pass
+
+        if not self.pooled and self._pool:
+            connection = self._pool[0]
+        else:
+            connection = self._connect()
+            with self._pool_lock:
+                self._pool.append(connection)
+        self._local.connection = connection
+        self._local.cursor = connection.cursor()
+
+        return self._local.connection, self._local.cursor
+
+
+    def _connect(self) -> sqlite3.Connection:
+        """
+        Opens a new connection and applies the configured pragmas to it.
+
+        Returns:
+        sqlite3.Connection: The opened connection.
+        """
+
+        connection = sqlite3.connect(self.database_name,
+                                     check_same_thread=not self.pooled)
+        for name, value in self.pragmas.items():
+            if not re.fullmatch(r'\w+', name) or \
+                    not re.fullmatch(r'-?\w+', str(value)):
+                raise ValueError(f'Invalid pragma: {name} = {value}')
+            connection.execute(f'PRAGMA {name} = {value}').fetchall()
+        if self.stats is not None:
+            connection.set_trace_callback(self.stats.trace)
+
+        return connection
+
+
+    def release_connection(self) -> None:
+        """
+        Commits and closes the calling thread's connection in pooled mode.
+        Worker threads should call it before they finish.
+        """
+
+        connection = getattr(self._local, 'connection', None)
+        if not self.pooled or connection is None:
+            return
+
+        connection.commit()
+        self._local.cursor.close()
+        connection.close()
+        with self._pool_lock:
+            self._pool.remove(connection)
+        del self._local.connection, self._local.cursor
 
 
     def add_new_genres(self, genres: list[str], silent: bool = False) -> None:
@@ -42,10 +240,12 @@ class Database():
                 if not silent:
                     print(f'{genre} already exists in DB')
 
+        self._cache.invalidate()
         return self.commit_changes()
 
 
-    def search(self, keyword: str) -> list[tuple]:
+    @cached_lookup
+    def search(self, keyword: str, limit: int = None) -> list[tuple]:
         """
         The search method searches for books in the database based on a given
         keyword.
@@ -53,26 +253,121 @@ class Database():
         Args:
         keyword (str): A string representing the keyword to be used for
         searching.
+        limit (int): Maximum amount of books returned (default is all of
+        them).
 
         Returns:
         list[tuple]: A list of tuples, where each tuple represents a book
-        record from the database.
+        record from the database, best matches first.
         [(UID: int, title: str, author: str, description: str,genre: str,
         amount_of_pages: int), ...]
 
         Behavior:
-        The method converts the provided keyword to lowercase and constructs
-        an SQL query to search for books whose title or author contains the
-        keyword (case-insensitive). It then executes the query with the
-        provided parameters and returns all the matching results fetched from
-        the database.
+        Every word of the keyword is treated as a prefix, and a book matches
+        when all of the words are found in its title or author. The lookup
+        goes through the full-text index (case- and accent-insensitive) and
+        results are ordered by relevance. A keyword without any word
+        characters falls back to a plain substring scan.
+        """
+
+        match_query = self._build_match_query(keyword, ['title', 'author'])
+        if not match_query:
+            return self._search_by_substring(keyword, limit)
+
+        query = """
+        SELECT books_view.* FROM books_fts
+        JOIN books_view ON books_view.id = books_fts.rowid
+        WHERE books_fts MATCH ? ORDER BY books_fts.rank LIMIT ?
+                """
+        params = (match_query, -1 if limit is None else limit)
+
+        self.cursor.execute(query, params)
+
+        return self.cursor.fetchall()
+
+
+    @cached_lookup
+    def search_full_text(self, keyword: str, columns: list[str] = None,
+                         limit: int = None) -> list[tuple]:
+        """
+        Searches books by keyword through the full-text index, including
+        the description of the book.
+
+        Args:
+        keyword (str): Words to look for, each one is treated as a prefix.
+        columns (list[str]): Columns to search in, any of 'title', 'author'
+        and 'description' (default is all of them).
+        limit (int): Maximum amount of books returned (default is all of
+        them).
+
+        Returns:
+        list[tuple]: A list of book records, best matches first.
+        [(UID: int, title: str, author: str, description: str,genre: str,
+        amount_of_pages: int), ...]
+        """
+
+        match_query = self._build_match_query(
+            keyword, columns or ['title', 'author', 'description'])
+        if not match_query:
+            return []
+
+        query = """
+        SELECT books_view.* FROM books_fts
+        JOIN books_view ON books_view.id = books_fts.rowid
+        WHERE books_fts MATCH ? ORDER BY books_fts.rank LIMIT ?
+                """
+
+        self.cursor.execute(query, (match_query,
+                                    -1 if limit is None else limit))
+
+        return self.cursor.fetchall()
+
+
+    @staticmethod
+    def _build_match_query(keyword: str, columns: list[str]) -> str:
+        """
+        Builds an FTS5 MATCH expression out of a user keyword.
+
+        Args:
+        keyword (str): Raw user input.
+        columns (list[str]): Indexed columns the expression is limited to.
+
+        Returns:
+        str: MATCH expression where every word is a quoted prefix term, or
+        an empty string if the keyword contains no words.
+        """
+
+        words = re.findall(r'\w+', keyword)
+        if not words:
+            return ''
+
+        terms = ' AND '.join(f'"{word}"*' for word in words)
+
+        return f'{{{" ".join(columns)}}} : ({terms})'
+
+
+    def _search_by_substring(self, keyword: str,
+                             limit: int = None) -> list[tuple]:
+        """
+        Searches books whose title or author contains the keyword, scanning
+        the whole books table.
+
+        Args:
+        keyword (str): Substring to look for (case-insensitive).
+        limit (int): Maximum amount of books returned (default is all of
+        them).
+
+        Returns:
+        list[tuple]: A list of matching book records.
         """
 
         keyword = keyword.lower()
         query = """
-        SELECT * FROM books WHERE LOWER(title) LIKE ? OR LOWER(author) LIKE ?
+        SELECT * FROM books_view
+        WHERE LOWER(title) LIKE ? OR LOWER(author) LIKE ? LIMIT ?
                 """
-        params = ('%' + keyword + '%', '%' + keyword + '%',)
+        params = ('%' + keyword + '%', '%' + keyword + '%',
+                  -1 if limit is None else limit)
 
         self.cursor.execute(query, params)
 
@@ -93,36 +388,280 @@ class Database():
 
         return self.cursor.fetchall()
     
-    def delete_book(self, uid: int) -> None:
+    def get_genres_by_prefix(self, prefix: str, limit: int = 10,
+                             offset: int = 0) -> tuple[list[tuple], bool]:
+        """
+        Retrieves one page of genres whose name starts with a prefix,
+        ignoring case, in alphabetical order.
+
+        Args:
+        prefix (str): Beginning of the genre name, '' for all genres.
+        limit (int): Maximum amount of genres on the page.
+        offset (int): Amount of matching genres to skip.
+
+        Returns:
+        tuple[list[tuple], bool]: Genres of the page
+        [(id: int, genre_name: str), ...] and whether more genres match.
+
+        Behavior:
+        The prefix is matched with LIKE against a case-insensitive index
+        on genre names, so only the matching range of the index is read.
+        """
+
+        escaped_prefix = re.sub(r'([\\%_])', r'\\\1', prefix)
+        query = r"""
+        SELECT id, genre_name FROM genres WHERE genre_name LIKE ? ESCAPE '\'
+        ORDER BY genre_name COLLATE NOCASE LIMIT ? OFFSET ?
+                """
+        params = (escaped_prefix + '%', limit + 1, offset)
+
+        self.cursor.execute(query, params)
+        genres = self.cursor.fetchall()
+
+        return genres[:limit], len(genres) > limit
+
+
+    def delete_book(self, uid: int) -> int:
         """
         Delete a book from the database by its unique identifier.
 
         Args:
         uid (int): The unique identifier of the book to delete.
+
+        Returns:
+        int: Amount of deleted books, 0 if the book did not exist.
         """
 
+        self.cursor.execute('SELECT title, author FROM books WHERE id = ?',
+                            (uid, ))
+        book = self.cursor.fetchone()
+        if book:
+            self.cursor.executemany(
+                'DELETE FROM book_trigrams WHERE trigram = ? AND book_id = ?',
+                fuzzy.book_trigram_rows([(uid, *book)]))
+
         query, params = 'DELETE FROM books WHERE id = ?', (uid, )
 
         self.cursor.execute(query, params)
+        if book and self._prefix_index is not None:
+            self._prefix_index.remove_many(book)
+        self._cache.invalidate()
 
-    def add_new_book(self, book: Book) -> None:
+        return self.cursor.rowcount
+
+    def add_new_book(self, book: Book) -> int:
         """
         Add a new book to the database.
 
         Args:
         book (Book): An instance of the Book class representing the book to
-        add.
+        add. If its id is set, it becomes the UID of the book, otherwise the
+        UID after the largest one is taken.
+
+        Returns:
+        int: UID of the added book.
         """
 
         query = """
-        INSERT INTO books (title, author, description, genre, 
-        amount_of_pages) VALUES (?, ?, ?, ?, ?)
+        INSERT INTO books (id, title, author, description, genre_id,
+        amount_of_pages) VALUES (?, ?, ?, ?,
+        (SELECT id FROM genres WHERE genre_name = ?), ?)
                 """
-        params = (book.title, book.author, book.description, book.genre,
-                  book.amount_of_pages,)
+        params = (book.id, book.title, book.author, book.description,
+                  book.genre, book.amount_of_pages,)
         
         self.cursor.execute(query, params)
+        book_uid = self.cursor.lastrowid
+        self._index_trigrams([(book_uid, book.title, book.author)])
+        if self._prefix_index is not None:
+            self._prefix_index.add_many((book.title, book.author))
+        self._cache.invalidate()
+
+        return book_uid
+
+
+    def add_new_books(self, books: Iterable[Book]) -> int:
+        """
+        Add many new books to the database in one go.
+
+        Args:
+        books (Iterable[Book]): Book instances to add. Any iterable works,
+        books are consumed lazily. UIDs are chosen as by add_new_book().
+
+        Returns:
+        int: Amount of added books.
+
+        Behavior:
+        Changes are not committed, so that the caller decides how many books
+        go into one transaction. Books are inserted one statement each, so
+        the UID of every added book is known from lastrowid; books other
+        connections add meanwhile are never mistaken for them.
+        """
+
+        query = """
+        INSERT INTO books (id, title, author, description, genre_id,
+        amount_of_pages) VALUES (?, ?, ?, ?,
+        (SELECT id FROM genres WHERE genre_name = ?), ?)
+                """
+
+        new_books = []
+        for book in books:
+            self.cursor.execute(query, (book.id, book.title, book.author,
+                                        book.description, book.genre,
+                                        book.amount_of_pages))
+            new_books.append((self.cursor.lastrowid, book.title,
+                              book.author))
+
+        self._index_trigrams(new_books)
+        if self._prefix_index is not None:
+            self._prefix_index.add_many(
+                chain.from_iterable(book[1:] for book in new_books))
+        self._cache.invalidate()
+
+        return len(new_books)
+
+
+    def _index_trigrams(self, books: list[tuple]) -> None:
+        """
+        Adds books to the trigram index of fuzzy_search().
+
+        Args:
+        books (list[tuple]): (UID, title, author) rows of the new books.
+        """
+
+        self.cursor.executemany(
+            'INSERT OR IGNORE INTO book_trigrams (trigram, book_id) '
+            'VALUES (?, ?)', fuzzy.book_trigram_rows(books))
+
+
+    @cached_lookup
+    def fuzzy_search(self, keyword: str, limit: int = 10,
+                     threshold: float = 0.3) -> list[tuple]:
+        """
+        Searches books whose title or author resembles the keyword,
+        tolerating typos and missing accents.
+
+        Args:
+        keyword (str): Words to look for, e.g. 'tolkein hobit'.
+        limit (int): Maximum amount of books returned.
+        threshold (float): Share of the keyword trigrams a book must contain
+        to be returned, between 0 and 1.
+
+        Returns:
+        list[tuple]: A list of book records, most similar first.
+        [(UID: int, title: str, author: str, description: str,genre: str,
+        amount_of_pages: int), ...]
+
+        Behavior:
+        Title, author and keyword are casefolded, stripped of accents and
+        split into trigrams (see fuzzy.trigrams()). Candidates are the books
+        sharing enough of the rarest keyword trigrams, looked up in the
+        trigram index. At most FUZZY_LOOKUP_BUDGET index entries are read
+        (more only if the rarest keyword trigram alone is that common), so
+        the query time stops growing with the catalog. Candidates are then
+        ranked by fuzzy.similarity() over all the keyword trigrams.
+        """
+
+        query_trigrams = fuzzy.trigrams(keyword)
+        lookup_trigrams = self._choose_lookup_trigrams(query_trigrams)
+        if not lookup_trigrams:
+            return []
+
+        query = f"""
+        SELECT books_view.* FROM (
+            SELECT book_id, COUNT(*) AS shared FROM book_trigrams
+            WHERE trigram IN ({', '.join('?' * len(lookup_trigrams))})
+            GROUP BY book_id HAVING shared >= ?
+            ORDER BY shared DESC LIMIT ?
+        ) AS candidates
+        JOIN books_view ON books_view.id = candidates.book_id
+                """
+        min_shared = max(1, math.ceil(len(lookup_trigrams) * threshold))
+        # Candidates are ranked by the amount of shared trigrams only, so a
+        # few more than needed are fetched for the final ranking.
+        params = (*lookup_trigrams, min_shared, limit * 4)
+
+        self.cursor.execute(query, params)
+        scored_books = [(fuzzy.similarity(query_trigrams,
+                                          f'{book[1]} {book[2]}'), book)
+                        for book in self.cursor.fetchall()]
+        scored_books.sort(key=lambda scored: (scored[0], -scored[1][0]),
+                          reverse=True)
+
+        return [book for score, book in scored_books
+                if score[0] >= threshold][:limit]
+
+
+    def _choose_lookup_trigrams(self, query_trigrams: set[str]) -> list[str]:
+        """
+        Chooses the keyword trigrams whose index entries fuzzy_search()
+        reads.
+
+        Args:
+        query_trigrams (set[str]): Trigrams of the keyword.
 
+        Returns:
+        list[str]: The rarest trigrams contained in at most
+        FUZZY_LOOKUP_BUDGET books together (at least the rarest one), empty
+        if no book contains any of them.
+        """
+
+        if not query_trigrams:
+            return []
+
+        query = f"""
+        SELECT trigram, amount_of_books FROM book_trigram_stats
+        WHERE trigram IN ({', '.join('?' * len(query_trigrams))})
+        ORDER BY amount_of_books
+                """
+
+        self.cursor.execute(query, tuple(query_trigrams))
+
+        lookup_trigrams, amount_of_books = [], 0
+        for trigram, trigram_books in self.cursor.fetchall():
+            amount_of_books += trigram_books
+            if lookup_trigrams and amount_of_books > self.FUZZY_LOOKUP_BUDGET:
+                break
+            lookup_trigrams.append(trigram)
+
+        return lookup_trigrams
+
+
+    def autocomplete(self, prefix: str, limit: int = 10) -> list[str]:
+        """
+        Completes the beginning of a book title or author name.
+
+        Args:
+        prefix (str): Typed beginning, case and accents are ignored.
+        limit (int): Maximum amount of completions.
+
+        Returns:
+        list[str]: Distinct titles and authors starting with the prefix,
+        those of the most books first, then alphabetically.
+
+        Behavior:
+        The first call loads every title and author into an in-memory
+        PrefixIndex (see autocomplete.py), later calls only search it.
+        Books added or deleted through this object update the index in
+        place; a rollback makes the next call load it again.
+        """
+
+        return self._get_prefix_index().complete(prefix, limit)
+
+
+    def _get_prefix_index(self) -> PrefixIndex:
+        """Gets the autocomplete() index, loading it on first use."""
+
+        with self._prefix_index_lock:
+            if self._prefix_index is None:
+                self.cursor.execute('SELECT title, author FROM books')
+                self._prefix_index = PrefixIndex(
+                    chain.from_iterable(self.cursor.fetchall()))
+
+            return self._prefix_index
+
+
+    @cached_lookup
     def get_book_by_uid(self, uid: int) -> tuple:
         """
         Retrieve a book from the database by its unique identifier.
@@ -136,7 +675,7 @@ class Database():
         amount_of_pages: int)
         """
 
-        query, params = "SELECT * FROM books WHERE id = ?", (uid,)
+        query, params = "SELECT * FROM books_view WHERE id = ?", (uid,)
 
         self.cursor.execute(query, params)
 
@@ -154,13 +693,14 @@ class Database():
         amount_of_pages: int), ...]
         """
 
-        query = "SELECT * FROM books"
+        query = "SELECT * FROM books_view"
 
         self.cursor.execute(query)
 
         return self.cursor.fetchall()
 
 
+    @cached_lookup
     def get_all_books_by_genre(self, genre: str) -> list[tuple]:
         """
         Retrieves all books of a specific genre from the database
@@ -175,13 +715,330 @@ class Database():
         amount_of_pages: int), ...]
         """
 
-        query, params = "SELECT * FROM books WHERE genre = ?", (genre,)
+        query, params = "SELECT * FROM books_view WHERE genre = ?", (genre,)
 
         self.cursor.execute(query, params)
 
         return self.cursor.fetchall()
 
 
+    def iter_books(self, genre: str = None, keyword: str = None,
+                   batch_size: int = 1000,
+                   as_books: bool = False) -> Iterator[tuple]:
+        """
+        Lazily iterates over books ordered by UID, optionally filtered by
+        genre and/or search keyword.
+
+        Args:
+        genre (str): Only books of this genre (default is any genre).
+        keyword (str): Only books matching this keyword, see search()
+        (default is no keyword filter).
+        batch_size (int): Amount of rows fetched from SQLite at once.
+        as_books (bool): Yield Book objects built by book_factory instead of
+        tuples (default is False).
+
+        Yields:
+        tuple: Book records one by one
+        (UID: int, title: str, author: str, description: str, genre: str,
+        amount_of_pages: int)
+
+        Behavior:
+        Rows are read with fetchmany on a dedicated cursor, so memory use
+        does not depend on the amount of books and other Database methods
+        may be called while iterating.
+        """
+
+        source, conditions, params, uid_column = self._books_filter(genre,
+                                                                    keyword)
+        query = f"""
+        SELECT books.* FROM {source} {self._where(conditions)}
+        ORDER BY {uid_column}
+                """
+
+        cursor = self.connection.cursor()
+        if as_books:
+            cursor.row_factory = book_factory
+        try:
+            cursor.execute(query, params)
+            while True:
+                books = cursor.fetchmany(batch_size)
+                if not books:
+                    break
+                yield from books
+        finally:
+            cursor.close()
+
+
+    def get_books_columns(self, genre: str = None,
+                          keyword: str = None) -> BookColumns:
+        """
+        Retrieves books in a compact column-oriented form, optionally
+        filtered by genre and/or search keyword.
+
+        Args:
+        genre (str): Only books of this genre (default is any genre).
+        keyword (str): Only books matching this keyword, see search()
+        (default is no keyword filter).
+
+        Returns:
+        BookColumns: All matching books ordered by UID. Rows are streamed
+        from iter_books straight into the columns, so no list of tuples is
+        built on the way.
+        """
+
+        return BookColumns.from_rows(self.iter_books(genre, keyword))
+
+
+    def get_books_page(self, page_size: int = 10, after_uid: int = None,
+                       before_uid: int = None, genre: str = None,
+                       keyword: str = None, sort_by: str = 'id',
+                       descending: bool = False,
+                       sort_value: object = None) -> BooksPage:
+        """
+        Retrieves one page of books, optionally filtered by genre and/or
+        search keyword and sorted by one of the SORT_COLUMNS.
+
+        Args:
+        page_size (int): Maximum amount of books on the page.
+        after_uid (int): Return the page that follows the book with this UID.
+        before_uid (int): Return the page that precedes the book with this
+        UID. Ignored if after_uid is given.
+        genre (str): Only books of this genre (default is any genre).
+        keyword (str): Only books matching this keyword, see search()
+        (default is no keyword filter).
+        sort_by (str): Sort column, one of SORT_COLUMNS (default is 'id').
+        Books with equal values are ordered by UID. 'rank' lists keyword
+        searches by relevance, as search() does.
+        descending (bool): Sort in descending order.
+        sort_value: Sort column value of the after_uid/before_uid book, as
+        given by BooksPage.first_value/last_value. Looked up by UID when not
+        given and the books are not sorted by UID.
+
+        Returns:
+        BooksPage: The requested page with has_next/has_prev flags. Without
+        after_uid and before_uid the first page is returned.
+
+        Raises:
+        ValueError: If sort_by is not one of SORT_COLUMNS.
+        LookupError: If sort_value is needed but the boundary book no longer
+        exists.
+
+        Behavior:
+        Pages are addressed by the (sort value, UID) of their boundary books
+        (keyset pagination) and every sort column is backed by an index, also
+        combined with the genre filter, so a page is an index range lookup
+        of page_size + 1 rows no matter how many books are stored. Sorted by
+        genre, the lookup seeks to the boundary UID within its genre. Sorted
+        by title, author or pages, the books sharing the boundary value are
+        read up to the boundary book, so a page costs more the more books
+        share that value. Keyword searches sort the matching books only.
+        """
+
+        if sort_by not in self.SORT_COLUMNS:
+            raise ValueError(f'Cannot sort books by {sort_by!r}, expected one '
+                             f'of {", ".join(self.SORT_COLUMNS)}')
+
+        source, conditions, params, uid_column = self._books_filter(genre,
+                                                                    keyword)
+        backwards = after_uid is None and before_uid is not None
+        boundary_uid = after_uid if after_uid is not None else before_uid
+
+        if sort_by == 'rank' and uid_column != 'books_fts.rowid':
+            sort_by = 'id'
+        sort_column, sort_index = self.SORT_COLUMNS[sort_by]
+        if sort_column is None:
+            key_columns, key = [uid_column], [boundary_uid]
+        else:
+            key_columns = [sort_column, uid_column]
+            if boundary_uid is not None and sort_value is None:
+                sort_value = self._get_sort_value(
+                    boundary_uid, sort_by,
+                    self._build_match_query(keyword, ['title', 'author']))
+            key = [sort_value, boundary_uid]
+
+        forward, backward = ('<', '>') if descending else ('>', '<')
+        key_conditions, key_params = [], []
+        if boundary_uid is not None:
+            key_conditions, key_params = self._key_range(
+                key_columns, backward if backwards else forward, key)
+        elif sort_by == 'genre':
+            # Every genre name matches, but the range makes SQLite walk the
+            # genres by name instead of sorting all the books.
+            key_conditions = ["books.genre >= ''"]
+
+        order = 'DESC' if descending != backwards else 'ASC'
+        query = f"""
+        SELECT books.* FROM {source} {self._where(conditions + key_conditions)}
+        ORDER BY {', '.join(f'{column} {order}' for column in key_columns)}
+        LIMIT ?
+                """
+
+        self.cursor.execute(query, params + key_params + [page_size + 1])
+        books = self.cursor.fetchall()
+
+        has_more = len(books) > page_size
+        books = books[:page_size]
+        if backwards:
+            books.reverse()
+
+        page = BooksPage(books, has_next=False, has_prev=False,
+                         sort_index=sort_index)
+        if backwards:
+            page.has_prev = has_more
+            page.has_next = self._books_exist(source, conditions, params,
+                                              key_columns, forward + '=', key)
+        else:
+            page.has_next = has_more
+            page.has_prev = after_uid is not None and self._books_exist(
+                source, conditions, params, key_columns, backward + '=', key)
+
+        return page
+
+
+    def _get_sort_value(self, uid: int, sort_by: str,
+                        match_query: str = None) -> object:
+        """
+        Gets the sort column value of a book.
+
+        Args:
+        uid (int): UID of the book.
+        sort_by (str): Sort column, one of SORT_COLUMNS but 'id'.
+        match_query (str): MATCH expression the relevance is computed for,
+        needed by the 'rank' sort only.
+
+        Returns:
+        object: The value, as compared by get_books_page().
+
+        Raises:
+        LookupError: If the book does not exist or does not match.
+        """
+
+        sort_index = self.SORT_COLUMNS[sort_by][1]
+        if sort_index is not None:
+            book = self.get_book_by_uid(uid)
+        else:
+            self.cursor.execute('SELECT rank FROM books_fts '
+                                'WHERE books_fts MATCH ? AND rowid = ?',
+                                (match_query, uid))
+            book, sort_index = self.cursor.fetchone(), 0
+        if not book:
+            raise LookupError(f'Book {uid} does not exist')
+
+        return book[sort_index]
+
+
+    def _books_filter(self, genre: str = None,
+                      keyword: str = None) -> tuple[str, list, list, str]:
+        """
+        Builds the FROM source and WHERE conditions selecting books by genre
+        and/or keyword.
+
+        Args:
+        genre (str): Genre to filter by, if any.
+        keyword (str): Search keyword to filter by, if any.
+
+        Returns:
+        tuple[str, list, list, str]: FROM source, list of SQL conditions,
+        list of their parameters and the column holding the book UID.
+        """
+
+        source = 'books_view AS books'
+        conditions, params, uid_column = [], [], 'books.id'
+
+        if keyword is not None:
+            match_query = self._build_match_query(keyword, ['title', 'author'])
+            if match_query:
+                source = ('books_fts JOIN books_view AS books '
+                          'ON books.id = books_fts.rowid')
+                conditions.append('books_fts MATCH ?')
+                params.append(match_query)
+                uid_column = 'books_fts.rowid'
+            else:
+                conditions.append(
+                    '(LOWER(title) LIKE ? OR LOWER(author) LIKE ?)')
+                params += ['%' + keyword.lower() + '%'] * 2
+
+        if genre is not None:
+            conditions.append('books.genre = ?')
+            params.append(genre)
+
+        return source, conditions, params, uid_column
+
+
+    @staticmethod
+    def _where(conditions: list[str]) -> str:
+        """Joins SQL conditions into a WHERE clause (empty if no conditions)."""
+
+        return f'WHERE {" AND ".join(conditions)}' if conditions else ''
+
+
+    @staticmethod
+    def _key_range(key_columns: list[str], operator: str,
+                   key: list) -> tuple[list, list]:
+        """
+        Builds the conditions selecting books whose sort key lies before or
+        after the given one.
+
+        Args:
+        key_columns (list[str]): Sort column (if any) followed by the UID
+        column.
+        operator (str): '<', '<=', '>' or '>='.
+        key (list): Sort value (if any) followed by the UID.
+
+        Returns:
+        tuple[list, list]: SQL conditions and their parameters.
+
+        Behavior:
+        The sort column is compared on its own, so its index is searched
+        from the boundary value on. The UID is only bounded among books
+        with the boundary value, through a CASE depending on the sort column
+        alone. For the genre, which SQLite walks in an outer loop over the
+        genres table, that bound becomes a UID range of the genre index
+        instead of a scan of the boundary genre from its first book.
+        """
+
+        if len(key_columns) == 1:
+            return [f'{key_columns[0]} {operator} ?'], key
+
+        sort_column, uid_column = key_columns
+        # UID bound of the books past the boundary value, matching any UID.
+        unbounded = -2 ** 63 if operator[0] == '>' else 2 ** 63 - 1
+
+        return ([f'{sort_column} {operator[0]}= ?',
+                 f'{uid_column} {operator} CASE WHEN {sort_column} = ? '
+                 f'THEN ? ELSE {unbounded} END'],
+                [key[0], key[0], key[1]])
+
+
+    def _books_exist(self, source: str, conditions: list, params: list,
+                     key_columns: list[str], operator: str, key: list) -> bool:
+        """
+        Checks whether any book matching the conditions lies before or after
+        the given sort key.
+
+        Args:
+        source (str): FROM source built by _books_filter().
+        conditions (list): SQL conditions built by _books_filter().
+        params (list): Parameters of the conditions.
+        key_columns (list[str]): Sort column (if any) followed by the UID
+        column.
+        operator (str): Comparison with the key, e.g. '<=' to look before it.
+        key (list): Sort value (if any) followed by the boundary UID.
+
+        Returns:
+        bool: True if at least one such book exists.
+        """
+
+        key_conditions, key_params = self._key_range(key_columns, operator,
+                                                     key)
+        query = (f"SELECT 1 FROM {source} "
+                 f"{self._where(conditions + key_conditions)} LIMIT 1")
+
+        self.cursor.execute(query, params + key_params)
+
+        return self.cursor.fetchone() is not None
+
+
     def get_last_book_added(self) -> tuple:
         """
         Gets the last book added to database.
@@ -192,7 +1049,9 @@ class Database():
         amount_of_pages: int)
         """
 
-        query = "SELECT * FROM books WHERE id=(SELECT MAX(id) FROM books)"
+        query = """
+        SELECT * FROM books_view WHERE id=(SELECT MAX(id) FROM books)
+                """
 
         self.cursor.execute(query)
         return self.cursor.fetchone()
@@ -206,14 +1065,384 @@ class Database():
         int: Amount of all books in database
         """
 
-        return len(self.get_all_books())
+        query = "SELECT amount_of_books FROM books_stats WHERE id = 1"
+
+        self.cursor.execute(query)
+
+        return self.cursor.fetchone()[0]
+
+
+    def is_empty(self) -> bool:
+        """
+        Checks whether there are no books in database.
+
+        Returns:
+        bool: True if database holds no books, False otherwise.
+        """
+
+        return self.get_amount_of_books() == 0
+
+
+    def get_amount_of_books_by_genre(self, genre: str) -> int:
+        """
+        Gets an amount of books of a specific genre.
+
+        Args:
+        genre (str): The genre of the books to count.
+
+        Returns:
+        int: Amount of books of the genre in database
+        """
+
+        query = """
+        SELECT amount_of_books FROM genre_stats
+        WHERE genre_id = (SELECT id FROM genres WHERE genre_name = ?)
+                """
+        params = (genre,)
+
+        self.cursor.execute(query, params)
+        result = self.cursor.fetchone()
+
+        return result[0] if result else 0
+
+
+    def get_statistics(self) -> dict:
+        """
+        Gets the catalog statistics maintained by database triggers.
+
+        Returns:
+        dict: Catalog statistics
+        {'amount_of_books': int, 'pages_min': int, 'pages_max': int,
+        'pages_sum': int, 'amount_of_books_by_genre': {genre: int, ...}}
+        Page-count minimum and maximum are None for an empty catalog.
+        """
+
+        query = """
+        SELECT amount_of_books, pages_min, pages_max, pages_sum
+        FROM books_stats WHERE id = 1
+                """
+
+        self.cursor.execute(query)
+        amount_of_books, pages_min, pages_max, pages_sum = \
+            self.cursor.fetchone()
+
+        query = """
+        SELECT genres.genre_name, genre_stats.amount_of_books
+        FROM genre_stats JOIN genres ON genres.id = genre_stats.genre_id
+                """
+
+        self.cursor.execute(query)
+        amount_of_books_by_genre = dict(self.cursor.fetchall())
+
+        return {'amount_of_books': amount_of_books,
+                'pages_min': pages_min,
+                'pages_max': pages_max,
+                'pages_sum': pages_sum,
+                'amount_of_books_by_genre': amount_of_books_by_genre}
+
+
+    def get_last_change_seq(self) -> int:
+        """
+        Gets the sequence number of the latest logged change.
+
+        Returns:
+        int: Sequence number of the latest change of books or genres, 0 if
+        none was logged yet.
+
+        Behavior:
+        A new consumer reads it before its initial full read (e.g.
+        get_all_books()) and then follows get_changes() from it. Changes
+        already seen in the full read are applied once more, which is
+        harmless, as every change holds the whole row.
+        """
+
+        self.cursor.execute(
+            "SELECT seq FROM sqlite_sequence WHERE name = 'change_log'")
+        result = self.cursor.fetchone()
+
+        return result[0] if result else 0
+
+
+    def get_changes(self, since_seq: int = 0,
+                    limit: int = 1000) -> list[tuple]:
+        """
+        Reads the change log of books and genres after a sequence number.
+
+        Args:
+        since_seq (int): Sequence number of the last change the consumer
+        has applied, 0 to read from the beginning.
+        limit (int): Maximum amount of changes returned.
+
+        Returns:
+        list[tuple]: Changes in the order they were made.
+        [(seq: int, table_name: str, operation: str, row_id: int,
+        data: dict, changed_at: int), ...]
+        operation is 'insert', 'update' or 'delete'. data holds the whole
+        row after an insert or update and before a delete; book rows have
+        the Book attributes as keys, genre rows id and genre_name.
+        changed_at is a Unix timestamp.
+
+        Raises:
+        LookupError: If changes after since_seq were already dropped by
+        compact_changes() or restore(), so the consumer has to start over
+        with a full read.
+        """
+
+        query = """
+        SELECT seq, table_name, operation, row_id, data, changed_at
+        FROM change_log WHERE seq > ? ORDER BY seq LIMIT ?
+                """
+
+        import json
+
+        self.cursor.execute(query, (since_seq, limit))
+        changes = [(seq, table_name, operation, row_id, json.loads(data),
+                    changed_at)
+                   for seq, table_name, operation, row_id, data, changed_at
+                   in self.cursor.fetchall()]
+
+        # Checked after reading, so a compaction committed in between is
+        # noticed as well.
+        self.cursor.execute(
+            'SELECT pruned_seq FROM change_log_state WHERE id = 1')
+        pruned_seq = self.cursor.fetchone()[0]
+        if since_seq < pruned_seq:
+            raise LookupError(f'Changes after {since_seq} were dropped '
+                              f'up to {pruned_seq}, read the catalog again')
+
+        return changes
+
+
+    def iter_changes(self, since_seq: int = 0,
+                     batch_size: int = 1000) -> Iterator[tuple]:
+        """
+        Lazily iterates over the change log after a sequence number, see
+        get_changes().
+
+        Args:
+        since_seq (int): Sequence number of the last applied change.
+        batch_size (int): Amount of changes read at once.
+
+        Yields:
+        tuple: Changes one by one, until the latest one logged.
+        """
+
+        while True:
+            changes = self.get_changes(since_seq, batch_size)
+            yield from changes
+            if len(changes) < batch_size:
+                return
+            since_seq = changes[-1][0]
+
+
+    def compact_changes(self, retention: float = None) -> int:
+        """
+        Applies the retention policy of the change log and commits.
+
+        Args:
+        retention (float): Seconds during which changes are kept as they
+        are (default is CHANGE_RETENTION).
+
+        Returns:
+        int: Amount of dropped changes.
+
+        Behavior:
+        Of the changes older than retention, only the last change of every
+        row is kept, and only if it is not a delete. Consumers applying
+        inserts and updates as upserts end in the same state as with the
+        whole log. Consumers that are behind one of the dropped deletes get
+        LookupError from get_changes() and have to read the catalog again.
+        """
+
+        if retention is None:
+            retention = self.CHANGE_RETENTION
+
+        self.cursor.execute(
+            'SELECT MAX(seq) FROM change_log '
+            "WHERE changed_at < CAST(strftime('%s', 'now') AS INTEGER) - ?",
+            (retention, ))
+        cutoff_seq = self.cursor.fetchone()[0]
+        if cutoff_seq is None:
+            return 0
+
+        query = """
+        DELETE FROM change_log WHERE seq <= ? AND seq NOT IN (
+            SELECT MAX(seq) FROM change_log GROUP BY table_name, row_id)
+                """
+        self.cursor.execute(query, (cutoff_seq, ))
+        dropped = self.cursor.rowcount
+
+        self.cursor.execute(
+            "SELECT MAX(seq) FROM change_log "
+            "WHERE seq <= ? AND operation = 'delete'", (cutoff_seq, ))
+        last_dropped_delete = self.cursor.fetchone()[0]
+        if last_dropped_delete is not None:
+            self.cursor.execute(
+                "DELETE FROM change_log "
+                "WHERE seq <= ? AND operation = 'delete'", (cutoff_seq, ))
+            dropped += self.cursor.rowcount
+            self.cursor.execute(
+                'UPDATE change_log_state '
+                'SET pruned_seq = MAX(pruned_seq, ?) WHERE id = 1',
+                (last_dropped_delete, ))
+
+        self.commit_changes()
+
+        return dropped
+
+
+    def backup(self, directory: str = None, keep: int = None,
+               pages: int = None, sleep: float = None) -> dict:
+        """
+        Takes a snapshot of the database while it stays in use (see
+        backup.create_snapshot()).
+
+        Args:
+        directory (str): Directory of the snapshots (default is a backups
+        directory next to the database file).
+        keep (int): Amount of snapshots to keep, the oldest ones beyond it
+        are deleted (default is backup.SNAPSHOT_KEEP).
+        pages (int): Pages copied per step (default is backup.STEP_PAGES).
+        Other connections can read and write between the steps.
+        sleep (float): Seconds to sleep after every step (default is
+        backup.STEP_SLEEP).
+
+        Returns:
+        dict: {'path': str, 'removed': list[str], 'pages': int,
+        'bytes': int, 'steps': int, 'restarts': int, 'seconds': float,
+        'pages_per_second': float}
+
+        Raises:
+        ValueError: If the snapshot fails the integrity check.
+
+        Behavior:
+        Pending changes are committed first, as the backup API cannot read
+        a database its own connection is writing to.
+        """
+
+        import backup
+
+        if directory is None:
+            directory = os.path.join(
+                os.path.dirname(os.path.abspath(self.database_name)),
+                'backups')
+        name = os.path.splitext(os.path.basename(self.database_name))[0]
+
+        self.commit_changes()
+
+        return backup.create_snapshot(
+            self.connection, directory, name,
+            backup.SNAPSHOT_KEEP if keep is None else keep,
+            backup.STEP_PAGES if pages is None else pages,
+            backup.STEP_SLEEP if sleep is None else sleep)
+
+
+    def restore(self, path: str) -> dict:
+        """
+        Replaces the whole database with a snapshot taken by backup().
+
+        Args:
+        path (str): Path of the snapshot.
+
+        Returns:
+        dict: backup.restore_snapshot() report.
+
+        Raises:
+        LookupError: If there is no such snapshot.
+        ValueError: If the snapshot fails the integrity check. The database
+        is left untouched then.
+
+        Behavior:
+        Pending changes are committed first. Snapshots of older schema
+        versions are migrated after being restored, and the lookup cache and
+        autocomplete() index are dropped.
+        The change log of the snapshot is older than the one it replaces,
+        so sequence numbers would be handed out again. Instead, the restore
+        takes the sequence number after the last one handed out before it
+        and marks the log as compacted up to it: every existing consumer of
+        get_changes() gets LookupError and reads the catalog again.
+        """
+
+        import backup
+
+        self.commit_changes()
+        last_seq = self.get_last_change_seq()
+        report = backup.restore_snapshot(path, self.connection)
+
+        migrations.migrate(self.connection)
+        restore_seq = max(last_seq, self.get_last_change_seq()) + 1
+        self.cursor.execute(
+            "UPDATE sqlite_sequence SET seq = ? WHERE name = 'change_log'",
+            (restore_seq, ))
+        if not self.cursor.rowcount:
+            self.cursor.execute(
+                'INSERT INTO sqlite_sequence (name, seq) '
+                "VALUES ('change_log', ?)", (restore_seq, ))
+        self.cursor.execute(
+            'UPDATE change_log_state SET pruned_seq = ? WHERE id = 1',
+            (restore_seq, ))
+        self.connection.commit()
+
+        self._prefix_index = None
+        self._cache.invalidate()
+
+        return report
+
+
+    def get_cache_stats(self) -> dict:
+        """
+        Gets hit/miss statistics of the lookup cache.
+
+        Returns:
+        dict: {'hits': int, 'misses': int, 'size': int, 'max_size': int,
+        'rows': int, 'max_rows': int, 'generation': int}
+        """
+
+        return self._cache.get_stats()
+
+
+    @contextlib.contextmanager
+    def batch(self) -> Iterator[WriteBatch]:
+        """
+        Groups several writes into a single transaction.
+
+        Yields:
+        WriteBatch: Object to add and delete books through. It collects the
+        UIDs of added books and the amount of deleted ones.
+
+        Behavior:
+        All writes made inside the with block (including pending ones made
+        before it) are committed once when the block ends, so a batch costs
+        a single fsync. If the block raises, they are rolled back instead.
+        """
+
+        write_batch = WriteBatch(self)
+        try:
+            yield write_batch
+        except BaseException:
+            self.rollback_changes()
+            raise
+
+        self.commit_changes()
 
 
     def commit_changes(self) -> None:
         self.connection.commit()
+        self._cache.invalidate()
+
+
+    def rollback_changes(self) -> None:
+        self.connection.rollback()
+        # Rolled back writes were applied to the autocomplete index already,
+        # so it is rebuilt on next use.
+        self._prefix_index = None
+        self._cache.invalidate()
 
 
     def close_connection(self) -> None:
-        self.commit_changes()
-        self.cursor.close()
-        self.connection.close()
+        with self._pool_lock:
+            connections, self._pool = self._pool, []
+        for connection in connections:
+            connection.commit()
+            connection.close()
+        self._local = threading.local()
@@ -8,11 +8,47 @@ CREATE TABLE IF NOT EXISTS books (
                 title           TEXT (1, 256) NOT NULL,
                 author           TEXT (1, 128) NOT NULL,
                 description     TEXT (0, 512),
-                genre           TEXT (1, 64) NOT NULL,
+                genre_id        INTEGER       NOT NULL
+                                            REFERENCES genres (id),
                 amount_of_pages INTEGER (1)   NOT NULL
             );
 """
 
+books_genre_index = """
+CREATE INDEX IF NOT EXISTS books_genre_id_idx ON books (genre_id);
+"""
+
+books_view = """
+CREATE VIEW IF NOT EXISTS books_view AS
+        SELECT books.id              AS id,
+               books.title           AS title,
+               books.author          AS author,
+               books.description     AS description,
+               genres.genre_name     AS genre,
+               books.amount_of_pages AS amount_of_pages
+        FROM books JOIN genres ON genres.id = books.genre_id;
+"""
+
+books_genre_normalization = ["""
+INSERT OR IGNORE INTO genres (genre_name) SELECT DISTINCT genre FROM books;
+""", """
+DROP VIEW IF EXISTS books_view;
+""", """
+DROP TABLE IF EXISTS books_stats;
+""", """
+DROP TABLE IF EXISTS genre_stats;
+""", books_table.replace('books (', 'books_normalized (', 1), """
+INSERT INTO books_normalized (id, title, author, description, genre_id,
+                              amount_of_pages)
+        SELECT books.id, books.title, books.author, books.description,
+               genres.id, books.amount_of_pages
+        FROM books JOIN genres ON genres.genre_name = books.genre;
+""", """
+DROP TABLE books;
+""", """
+ALTER TABLE books_normalized RENAME TO books;
+"""]
+
 genres_table = """
 CREATE TABLE IF NOT EXISTS genres (
         id              INTEGER       PRIMARY KEY
@@ -24,4 +60,295 @@ CREATE TABLE IF NOT EXISTS genres (
 """
 
 initial_genres = ['Fantasy', 'Romance', 'Detective', 'Sci-Fi',
-                  'Thriller', 'Comedy', 'Classics']
\ No newline at end of file
+                  'Thriller', 'Comedy', 'Classics']
+
+books_fts_table = """
+CREATE VIRTUAL TABLE IF NOT EXISTS books_fts USING fts5(
+        title,
+        author,
+        description,
+        content='books',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+            );
+"""
+
+books_fts_rebuild = "INSERT INTO books_fts (books_fts) VALUES ('rebuild')"
+
+books_fts_triggers = ["""
+CREATE TRIGGER IF NOT EXISTS books_fts_after_insert AFTER INSERT ON books
+BEGIN
+        INSERT INTO books_fts (rowid, title, author, description)
+        VALUES (new.id, new.title, new.author, new.description);
+END;
+""", """
+CREATE TRIGGER IF NOT EXISTS books_fts_after_delete AFTER DELETE ON books
+BEGIN
+        INSERT INTO books_fts (books_fts, rowid, title, author, description)
+        VALUES ('delete', old.id, old.title, old.author, old.description);
+END;
+""", """
+CREATE TRIGGER IF NOT EXISTS books_fts_after_update AFTER UPDATE ON books
+BEGIN
+        INSERT INTO books_fts (books_fts, rowid, title, author, description)
+        VALUES ('delete', old.id, old.title, old.author, old.description);
+        INSERT INTO books_fts (rowid, title, author, description)
+        VALUES (new.id, new.title, new.author, new.description);
+END;
+"""]
+
+
+books_stats_table = """
+CREATE TABLE IF NOT EXISTS books_stats (
+        id              INTEGER       PRIMARY KEY
+                                    CHECK (id = 1),
+        amount_of_books INTEGER       NOT NULL
+                                    DEFAULT 0,
+        pages_min       INTEGER,
+        pages_max       INTEGER,
+        pages_sum       INTEGER       NOT NULL
+                                    DEFAULT 0
+            );
+"""
+
+genre_stats_table = """
+CREATE TABLE IF NOT EXISTS genre_stats (
+        genre_id        INTEGER       PRIMARY KEY
+                                    NOT NULL,
+        amount_of_books INTEGER       NOT NULL
+                                    DEFAULT 0
+            );
+"""
+
+books_pages_index = """
+CREATE INDEX IF NOT EXISTS books_amount_of_pages_idx
+        ON books (amount_of_pages);
+"""
+
+books_sort_indexes = ["""
+CREATE INDEX IF NOT EXISTS books_title_idx ON books (title COLLATE NOCASE);
+""", """
+CREATE INDEX IF NOT EXISTS books_author_idx ON books (author COLLATE NOCASE);
+""", """
+CREATE INDEX IF NOT EXISTS books_genre_title_idx
+        ON books (genre_id, title COLLATE NOCASE);
+""", """
+CREATE INDEX IF NOT EXISTS books_genre_author_idx
+        ON books (genre_id, author COLLATE NOCASE);
+""", """
+CREATE INDEX IF NOT EXISTS books_genre_pages_idx
+        ON books (genre_id, amount_of_pages);
+"""]
+
+books_stats_fill = ["""
+INSERT INTO books_stats (id, amount_of_books, pages_min, pages_max, pages_sum)
+        SELECT 1, COUNT(*), MIN(amount_of_pages), MAX(amount_of_pages),
+               COALESCE(SUM(amount_of_pages), 0)
+        FROM books;
+""", """
+INSERT INTO genre_stats (genre_id, amount_of_books)
+        SELECT genre_id, COUNT(*) FROM books GROUP BY genre_id;
+"""]
+
+books_stats_triggers = ["""
+CREATE TRIGGER IF NOT EXISTS books_stats_after_insert AFTER INSERT ON books
+BEGIN
+        UPDATE books_stats SET
+            amount_of_books = amount_of_books + 1,
+            pages_min = CASE WHEN pages_min IS NULL
+                                  OR new.amount_of_pages < pages_min
+                             THEN new.amount_of_pages ELSE pages_min END,
+            pages_max = CASE WHEN pages_max IS NULL
+                                  OR new.amount_of_pages > pages_max
+                             THEN new.amount_of_pages ELSE pages_max END,
+            pages_sum = pages_sum + new.amount_of_pages
+        WHERE id = 1;
+        INSERT INTO genre_stats (genre_id, amount_of_books)
+            VALUES (new.genre_id, 1)
+            ON CONFLICT (genre_id)
+            DO UPDATE SET amount_of_books = amount_of_books + 1;
+END;
+""", """
+CREATE TRIGGER IF NOT EXISTS books_stats_after_delete AFTER DELETE ON books
+BEGIN
+        UPDATE books_stats SET
+            amount_of_books = amount_of_books - 1,
+            pages_min = CASE WHEN old.amount_of_pages <= pages_min
+                             THEN (SELECT MIN(amount_of_pages) FROM books)
+                             ELSE pages_min END,
+            pages_max = CASE WHEN old.amount_of_pages >= pages_max
+                             THEN (SELECT MAX(amount_of_pages) FROM books)
+                             ELSE pages_max END,
+            pages_sum = pages_sum - old.amount_of_pages
+        WHERE id = 1;
+        UPDATE genre_stats SET amount_of_books = amount_of_books - 1
+            WHERE genre_id = old.genre_id;
+        DELETE FROM genre_stats
+            WHERE genre_id = old.genre_id AND amount_of_books <= 0;
+END;
+""", """
+CREATE TRIGGER IF NOT EXISTS books_stats_after_update
+        AFTER UPDATE OF genre_id, amount_of_pages ON books
+BEGIN
+        UPDATE books_stats SET
+            pages_min = (SELECT MIN(amount_of_pages) FROM books),
+            pages_max = (SELECT MAX(amount_of_pages) FROM books),
+            pages_sum = pages_sum - old.amount_of_pages + new.amount_of_pages
+        WHERE id = 1;
+        UPDATE genre_stats SET amount_of_books = amount_of_books - 1
+            WHERE genre_id = old.genre_id;
+        DELETE FROM genre_stats
+            WHERE genre_id = old.genre_id AND amount_of_books <= 0;
+        INSERT INTO genre_stats (genre_id, amount_of_books)
+            VALUES (new.genre_id, 1)
+            ON CONFLICT (genre_id)
+            DO UPDATE SET amount_of_books = amount_of_books + 1;
+END;
+"""]
+
+
+default_pragmas = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -16000,
+        'mmap_size': 268435456,
+        'busy_timeout': 5000,
+        'foreign_keys': 'ON',
+}
+
+
+genres_name_index = """
+CREATE INDEX IF NOT EXISTS genres_name_nocase_idx
+        ON genres (genre_name COLLATE NOCASE);
+"""
+
+book_trigrams_table = """
+CREATE TABLE IF NOT EXISTS book_trigrams (
+        trigram         TEXT          NOT NULL,
+        book_id         INTEGER       NOT NULL,
+        PRIMARY KEY (trigram, book_id)
+            ) WITHOUT ROWID;
+"""
+
+book_trigram_stats_table = """
+CREATE TABLE IF NOT EXISTS book_trigram_stats (
+        trigram         TEXT          PRIMARY KEY
+                                    NOT NULL,
+        amount_of_books INTEGER       NOT NULL
+            ) WITHOUT ROWID;
+"""
+
+book_trigram_stats_fill = """
+INSERT INTO book_trigram_stats (trigram, amount_of_books)
+        SELECT trigram, COUNT(*) FROM book_trigrams GROUP BY trigram;
+"""
+
+book_trigram_stats_triggers = ["""
+CREATE TRIGGER IF NOT EXISTS book_trigram_stats_after_insert
+        AFTER INSERT ON book_trigrams
+BEGIN
+        INSERT INTO book_trigram_stats (trigram, amount_of_books)
+            VALUES (new.trigram, 1)
+            ON CONFLICT (trigram)
+            DO UPDATE SET amount_of_books = amount_of_books + 1;
+END;
+""", """
+CREATE TRIGGER IF NOT EXISTS book_trigram_stats_after_delete
+        AFTER DELETE ON book_trigrams
+BEGIN
+        UPDATE book_trigram_stats SET amount_of_books = amount_of_books - 1
+            WHERE trigram = old.trigram;
+        DELETE FROM book_trigram_stats
+            WHERE trigram = old.trigram AND amount_of_books <= 0;
+END;
+"""]
+
+change_log_table = """
+CREATE TABLE IF NOT EXISTS change_log (
+        seq             INTEGER       PRIMARY KEY AUTOINCREMENT,
+        table_name      TEXT          NOT NULL,
+        operation       TEXT          NOT NULL
+                                    CHECK (operation IN ('insert', 'update',
+                                                         'delete')),
+        row_id          INTEGER       NOT NULL,
+        data            TEXT          NOT NULL,
+        changed_at      INTEGER       NOT NULL
+                                    DEFAULT (CAST(strftime('%s', 'now')
+                                                  AS INTEGER))
+            );
+"""
+
+change_log_state_table = """
+CREATE TABLE IF NOT EXISTS change_log_state (
+        id              INTEGER       PRIMARY KEY
+                                    CHECK (id = 1),
+        pruned_seq      INTEGER       NOT NULL
+                                    DEFAULT 0
+            );
+"""
+
+change_log_state_fill = """
+INSERT OR IGNORE INTO change_log_state (id, pruned_seq) VALUES (1, 0);
+"""
+
+change_log_triggers = ["""
+CREATE TRIGGER IF NOT EXISTS change_log_books_after_insert
+        AFTER INSERT ON books
+BEGIN
+        INSERT INTO change_log (table_name, operation, row_id, data)
+            VALUES ('books', 'insert', new.id, json_object(
+                'id', new.id, 'title', new.title, 'author', new.author,
+                'description', new.description,
+                'genre', (SELECT genre_name FROM genres
+                          WHERE id = new.genre_id),
+                'amount_of_pages', new.amount_of_pages));
+END;
+""", """
+CREATE TRIGGER IF NOT EXISTS change_log_books_after_update
+        AFTER UPDATE ON books
+BEGIN
+        INSERT INTO change_log (table_name, operation, row_id, data)
+            VALUES ('books', 'update', new.id, json_object(
+                'id', new.id, 'title', new.title, 'author', new.author,
+                'description', new.description,
+                'genre', (SELECT genre_name FROM genres
+                          WHERE id = new.genre_id),
+                'amount_of_pages', new.amount_of_pages));
+END;
+""", """
+CREATE TRIGGER IF NOT EXISTS change_log_books_after_delete
+        AFTER DELETE ON books
+BEGIN
+        INSERT INTO change_log (table_name, operation, row_id, data)
+            VALUES ('books', 'delete', old.id, json_object(
+                'id', old.id, 'title', old.title, 'author', old.author,
+                'description', old.description,
+                'genre', (SELECT genre_name FROM genres
+                          WHERE id = old.genre_id),
+                'amount_of_pages', old.amount_of_pages));
+END;
+""", """
+CREATE TRIGGER IF NOT EXISTS change_log_genres_after_insert
+        AFTER INSERT ON genres
+BEGIN
+        INSERT INTO change_log (table_name, operation, row_id, data)
+            VALUES ('genres', 'insert', new.id, json_object(
+                'id', new.id, 'genre_name', new.genre_name));
+END;
+""", """
+CREATE TRIGGER IF NOT EXISTS change_log_genres_after_update
+        AFTER UPDATE ON genres
+BEGIN
+        INSERT INTO change_log (table_name, operation, row_id, data)
+            VALUES ('genres', 'update', new.id, json_object(
+                'id', new.id, 'genre_name', new.genre_name));
+END;
+""", """
+CREATE TRIGGER IF NOT EXISTS change_log_genres_after_delete
+        AFTER DELETE ON genres
+BEGIN
+        INSERT INTO change_log (table_name, operation, row_id, data)
+            VALUES ('genres', 'delete', old.id, json_object(
+                'id', old.id, 'genre_name', old.genre_name));
+END;
+"""]
@@ -0,0 +1,108 @@
+"""This file represents a streaming export module for the Library database"""
+import argparse
+import csv
+import json
+import os
+from typing import TextIO
+from db import Database
+from importer import BOOK_FIELDS
+
+
+EXPORT_FIELDS = ['id'] + BOOK_FIELDS
+
+
+def write_csv(books, file: TextIO) -> int:
+    """
+    Writes books to a CSV file with a header line, row by row.
+
+    Args:
+    books: Iterable of book records in Database column order.
+    file (TextIO): Opened text file to write into.
+
+    Returns:
+    int: Amount of written books.
+    """
+
+    writer = csv.writer(file)
+    writer.writerow(EXPORT_FIELDS)
+    amount = 0
+    for book in books:
+        writer.writerow(book)
+        amount += 1
+
+    return amount
+
+
+def write_jsonl(books, file: TextIO) -> int:
+    """
+    Writes books to a JSON Lines file, one object per book.
+
+    Args:
+    books: Iterable of book records in Database column order.
+    file (TextIO): Opened text file to write into.
+
+    Returns:
+    int: Amount of written books.
+    """
+
+    amount = 0
+    for book in books:
+        file.write(json.dumps(dict(zip(EXPORT_FIELDS, book)),
+                              ensure_ascii=False))
+        file.write('\n')
+        amount += 1
+
+    return amount
+
+
+WRITERS = {'csv': write_csv, 'jsonl': write_jsonl}
+
+
+def export_books(db: Database, path: str, file_format: str = None,
+                 genre: str = None, keyword: str = None) -> int:
+    """
+    Exports books from the database into a CSV or JSONL file.
+
+    Args:
+    db (Database): Database to export from.
+    path (str): Path of the file to create.
+    file_format (str): 'csv' or 'jsonl', guessed from the file extension if
+    not given.
+    genre (str): Only export books of this genre.
+    keyword (str): Only export books matching this search keyword.
+
+    Returns:
+    int: Amount of exported books.
+
+    Behavior:
+    Books are streamed from Database.iter_books and written as they come,
+    so memory use stays flat whatever the catalog size. The output is
+    readable by importer.BookImporter.
+    """
+
+    file_format = file_format or os.path.splitext(path)[1].lstrip('.')
+    if file_format not in WRITERS:
+        raise ValueError(f'Unsupported export format: {file_format}')
+
+    books = db.iter_books(genre=genre, keyword=keyword)
+    with open(path, 'w', newline='', encoding='utf-8') as file:
+        return WRITERS[file_format](books, file)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Export books into a CSV or JSONL file.')
+    parser.add_argument('path', help='CSV or JSONL file to create')
+    parser.add_argument('--format', choices=WRITERS,
+                        help='file format (default: from the file extension)')
+    parser.add_argument('--genre', help='only export books of this genre')
+    parser.add_argument('--keyword',
+                        help='only export books matching this keyword')
+    args = parser.parse_args()
+
+    db = Database()
+    amount = export_books(db, args.path, args.format, args.genre,
+                          args.keyword)
+    db.close_connection()
+
+    print(f'Done: {amount} books exported to {args.path}')
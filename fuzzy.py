@@ -0,0 +1,83 @@
+"""Trigram helpers for the typo-tolerant book search"""
+import re
+import unicodedata
+from typing import Iterable, Iterator
+
+# Letters that are not a base letter plus a diacritic, so that NFKD
+# decomposition does not strip them.
+FOLDED_LETTERS = str.maketrans({'ł': 'l', 'ø': 'o', 'đ': 'd', 'ħ': 'h',
+                                'ı': 'i', 'æ': 'ae', 'œ': 'oe', 'þ': 'th'})
+
+WORD_PATTERN = re.compile(r'\w+')
+
+
+def normalize(text: str) -> str:
+    """Casefolds text and strips its accents ('Żółw' becomes 'zolw')."""
+
+    if text.isascii():
+        return text.lower()
+
+    text = unicodedata.normalize('NFKD', text.casefold())
+
+    return ''.join(char for char in text.translate(FOLDED_LETTERS)
+                   if not unicodedata.combining(char))
+
+
+def trigrams(text: str) -> set[str]:
+    """
+    Splits text into the trigrams of its normalized words.
+
+    Args:
+    text (str): Any text, e.g. a title or a search keyword.
+
+    Returns:
+    set[str]: Trigrams of every word padded with two spaces in front and
+    one at the end, so that word beginnings weigh more than their endings
+    ('cat' gives '  c', ' ca', 'cat', 'at ').
+    """
+
+    result = set()
+    for word in WORD_PATTERN.findall(normalize(text)):
+        padded = f'  {word} '
+        result.update(padded[index:index + 3]
+                      for index in range(len(padded) - 2))
+
+    return result
+
+
+def book_trigram_rows(books: Iterable[tuple]) -> Iterator[tuple[str, int]]:
+    """
+    Generates the book_trigrams rows of books.
+
+    Args:
+    books (Iterable[tuple]): (UID, title, author) rows.
+
+    Returns:
+    Iterator[tuple[str, int]]: (trigram, UID) rows.
+    """
+
+    for uid, title, author in books:
+        for trigram in trigrams(f'{title} {author}'):
+            yield trigram, uid
+
+
+def similarity(query_trigrams: set[str], text: str) -> tuple[float, float]:
+    """
+    Scores how well text matches a fuzzy search query.
+
+    Args:
+    query_trigrams (set[str]): Trigrams of the query.
+    text (str): Text to score, e.g. the title and author of a book.
+
+    Returns:
+    tuple[float, float]: Share of the query trigrams found in the text and
+    the Jaccard similarity of both trigram sets, both between 0 and 1.
+    Sorting by the pair ranks books containing the whole query first and,
+    among them, the ones with the least extra text.
+    """
+
+    text_trigrams = trigrams(text)
+    shared = len(query_trigrams & text_trigrams)
+
+    return (shared / len(query_trigrams),
+            shared / len(query_trigrams | text_trigrams))
@@ -0,0 +1,308 @@
+"""This file represents a bulk import module for the Library database"""
+import argparse
+import csv
+import json
+import os
+from typing import Callable, Iterator
+from book import Book
+from db import Database
+
+
+BOOK_FIELDS = ['title', 'author', 'description', 'genre', 'amount_of_pages']
+
+
+def read_csv_rows(path: str) -> Iterator[tuple[int, dict]]:
+    """
+    Lazily reads book rows from a CSV file with a header line.
+
+    Args:
+    path (str): Path to the CSV file. Its header must name the Book fields.
+
+    Yields:
+    tuple[int, dict]: Row number (starting from 1, header excluded) and
+    the row as a dictionary.
+    """
+
+    with open(path, newline='', encoding='utf-8') as file:
+        for row_number, row in enumerate(csv.DictReader(file), start=1):
+            yield row_number, row
+
+
+def read_jsonl_rows(path: str) -> Iterator[tuple[int, dict]]:
+    """
+    Lazily reads book rows from a JSON Lines file.
+
+    Args:
+    path (str): Path to the JSONL file, one JSON object per line.
+
+    Yields:
+    tuple[int, dict]: Line number (starting from 1) and the parsed object.
+    Lines that are not valid JSON objects are yielded as None, so that they
+    are reported as rejected.
+    """
+
+    with open(path, encoding='utf-8') as file:
+        for row_number, line in enumerate(file, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield row_number, row if isinstance(row, dict) else None
+
+
+def validate_row(row: dict, genres: set[str]) -> tuple[Book, str]:
+    """
+    Validates a raw row against the Book fields and the known genres.
+
+    Args:
+    row (dict): Raw row read from the import file.
+    genres (set[str]): Genre names existing in the database.
+
+    Returns:
+    tuple[Book, str]: The Book built from the row and an empty string, or
+    None and the reason why the row was rejected.
+    """
+
+    if row is None:
+        return None, 'malformed row'
+
+    missing = [field for field in BOOK_FIELDS
+               if field != 'description'
+               and (field not in row or row[field] in (None, ''))]
+    if missing:
+        return None, f'missing {", ".join(missing)}'
+
+    title = str(row['title']).strip()
+    author = str(row['author']).strip()
+    description = str(row.get('description') or '').strip()
+    genre = str(row['genre']).strip()
+
+    if not 1 <= len(title) <= 256:
+        return None, 'title must be 1-256 symbols long'
+    if not 1 <= len(author) <= 128:
+        return None, 'author must be 1-128 symbols long'
+    if len(description) > 512:
+        return None, 'description max. length is 512 symbols'
+    if genre not in genres:
+        return None, f'unknown genre {genre!r}'
+
+    try:
+        amount_of_pages = int(row['amount_of_pages'])
+    except (TypeError, ValueError):
+        return None, 'amount_of_pages must be a number'
+    if amount_of_pages < 1:
+        return None, 'amount_of_pages must be positive'
+
+    return Book(title, author, description, genre, amount_of_pages), ''
+
+
+class ImportReport:
+    """Outcome of a bulk import."""
+
+    def __init__(self, imported: int = 0, rejected: list = None,
+                 last_row: int = 0) -> None:
+
+        self.imported = imported
+        self.rejected = rejected if rejected is not None else []
+        self.last_row = last_row
+
+
+class BookImporter:
+    """
+    Class to stream books from CSV/JSONL files into the database in chunked
+    transactions.
+    """
+
+    READERS = {'csv': read_csv_rows, 'jsonl': read_jsonl_rows}
+
+    def __init__(self, db: Database, chunk_size: int = 1000,
+                 checkpoint_path: str = None,
+                 on_progress: Callable[[ImportReport], None] = None) -> None:
+
+        self.db = db
+        self.chunk_size = chunk_size
+        self.checkpoint_path = checkpoint_path
+        self.on_progress = on_progress
+        # Amount of rejected rows already in the rejected rows file.
+        self._saved_rejected = 0
+
+
+    def import_file(self, path: str, file_format: str = None) -> ImportReport:
+        """
+        Imports all valid books from a file.
+
+        Args:
+        path (str): Path to the CSV or JSONL file.
+        file_format (str): 'csv' or 'jsonl', guessed from the file
+        extension if not given.
+
+        Returns:
+        ImportReport: Amount of imported books, rejected rows as
+        (row_number, reason) pairs and the last processed row number.
+
+        Behavior:
+        Valid books are inserted with executemany and committed every
+        chunk_size rows. After each commit the last processed row number is
+        written to the checkpoint file (if any), and a later call with the
+        same checkpoint resumes right after it. Rejected rows are appended
+        to a {checkpoint}.rejected file next to it, so every commit only
+        writes the rows rejected since the previous one. Both files are
+        removed once the whole file has been imported.
+        """
+
+        file_format = file_format or os.path.splitext(path)[1].lstrip('.')
+        if file_format not in self.READERS:
+            raise ValueError(f'Unsupported import format: {file_format}')
+
+        report = self._load_checkpoint(path)
+        genres = {genre[1] for genre in self.db.get_all_genres()}
+        rows = self.READERS[file_format](path)
+        chunk, row_number = [], report.last_row
+
+        try:
+            for row_number, row in rows:
+                if row_number <= report.last_row:
+                    continue
+
+                book, reason = validate_row(row, genres)
+                if book:
+                    chunk.append(book)
+                else:
+                    report.rejected.append((row_number, reason))
+
+                if row_number - report.last_row >= self.chunk_size:
+                    self._flush(chunk, report, row_number, path)
+                    chunk = []
+
+            self._flush(chunk, report, row_number, path)
+        except BaseException:
+            self.db.rollback_changes()
+            raise
+
+        if self.checkpoint_path:
+            for checkpoint_file in (self.checkpoint_path,
+                                    self._rejected_path):
+                if os.path.exists(checkpoint_file):
+                    os.remove(checkpoint_file)
+
+        return report
+
+
+    @property
+    def _rejected_path(self) -> str:
+        """Path of the file the checkpoint keeps rejected rows in."""
+
+        return f'{self.checkpoint_path}.rejected'
+
+
+    def _flush(self, chunk: list[Book], report: ImportReport,
+               row_number: int, path: str) -> None:
+        """
+        Inserts a chunk of books, commits it and records the checkpoint.
+
+        Args:
+        chunk (list[Book]): Validated books to insert.
+        report (ImportReport): Report of the running import.
+        row_number (int): Last row number covered by the chunk.
+        path (str): Path of the imported file.
+        """
+
+        if chunk:
+            report.imported += self.db.add_new_books(chunk)
+        self.db.commit_changes()
+        report.last_row = max(report.last_row, row_number)
+
+        if self.checkpoint_path:
+            with open(self._rejected_path, 'a', encoding='utf-8') as file:
+                for rejected in report.rejected[self._saved_rejected:]:
+                    file.write(json.dumps(rejected))
+                    file.write('\n')
+                rejected_size = file.tell()
+            self._saved_rejected = len(report.rejected)
+            checkpoint = {'path': os.path.abspath(path),
+                          'last_row': report.last_row,
+                          'imported': report.imported,
+                          'rejected_size': rejected_size}
+            temporary_path = f'{self.checkpoint_path}.tmp'
+            with open(temporary_path, 'w', encoding='utf-8') as file:
+                json.dump(checkpoint, file)
+            os.replace(temporary_path, self.checkpoint_path)
+
+        if self.on_progress:
+            self.on_progress(report)
+
+
+    def _load_checkpoint(self, path: str) -> ImportReport:
+        """
+        Loads the report of an interrupted import of the same file.
+
+        Args:
+        path (str): Path of the file being imported.
+
+        Returns:
+        ImportReport: Report to resume from, empty if there is no
+        checkpoint for this file.
+
+        Behavior:
+        Rejected rows appended after the last checkpoint was written are
+        cut off the rejected rows file, as their rows are read again.
+        """
+
+        self._saved_rejected = 0
+        if not self.checkpoint_path:
+            return ImportReport()
+        if not os.path.exists(self.checkpoint_path):
+            if os.path.exists(self._rejected_path):
+                os.remove(self._rejected_path)
+            return ImportReport()
+
+        with open(self.checkpoint_path, encoding='utf-8') as file:
+            checkpoint = json.load(file)
+
+        if checkpoint.get('path') != os.path.abspath(path):
+            raise ValueError(
+                f'Checkpoint {self.checkpoint_path} belongs to another file: '
+                f'{checkpoint.get("path")}')
+
+        rejected = []
+        if os.path.exists(self._rejected_path):
+            with open(self._rejected_path, 'r+', encoding='utf-8') as file:
+                file.truncate(checkpoint['rejected_size'])
+                rejected = [tuple(json.loads(line)) for line in file]
+        self._saved_rejected = len(rejected)
+
+        return ImportReport(checkpoint['imported'], rejected,
+                            checkpoint['last_row'])
+
+
+def print_progress(report: ImportReport) -> None:
+    """Prints the progress of a running import."""
+
+    print(f'Row {report.last_row}: {report.imported} imported, '
+          f'{len(report.rejected)} rejected')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Bulk import books from a CSV or JSONL file.')
+    parser.add_argument('path', help='CSV or JSONL file to import')
+    parser.add_argument('--format', choices=BookImporter.READERS,
+                        help='file format (default: from the file extension)')
+    parser.add_argument('--chunk-size', type=int, default=1000,
+                        help='rows per transaction (default: 1000)')
+    parser.add_argument('--checkpoint',
+                        help='checkpoint file to resume an interrupted import')
+    args = parser.parse_args()
+
+    db = Database()
+    importer = BookImporter(db, args.chunk_size, args.checkpoint,
+                            print_progress)
+    result = importer.import_file(args.path, args.format)
+    db.close_connection()
+
+    for row_number, reason in result.rejected:
+        print(f'Rejected row {row_number}: {reason}')
+    print(f'Done: {result.imported} imported, '
+          f'{len(result.rejected)} rejected')
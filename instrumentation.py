@@ -0,0 +1,211 @@
+"""Opt-in query instrumentation for the Library database"""
+import bisect
+import functools
+import threading
+import time
+
+
+class QueryStats:
+    """
+    Collects per-method call counts and latency histograms of Database
+    methods, the SQL they run, and logs the slow ones.
+
+    A Database only pays for instrumentation when a QueryStats object is
+    passed to it; otherwise its methods are not wrapped at all.
+    """
+
+    BUCKETS = [0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0]
+
+    def __init__(self, slow_query_threshold: float = 0.1,
+                 slow_query_log: str = 'slow_queries.log') -> None:
+        """
+        Args:
+        slow_query_threshold (float): Calls lasting longer (in seconds) are
+        written to the slow-query log.
+        slow_query_log (str): Path of the slow-query log file, None to keep
+        slow calls only in memory.
+        """
+
+        self.slow_query_threshold = slow_query_threshold
+        self.slow_query_log = slow_query_log
+        self.methods = {}
+        self.slow_calls = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+
+    def trace(self, statement: str) -> None:
+        """
+        sqlite3 trace callback recording the statements run by the method
+        currently being measured in the calling thread.
+        """
+
+        stack = getattr(self._local, 'stack', None)
+        if stack:
+            stack[-1].append(statement)
+
+
+    def wrap(self, db, name: str, method):
+        """
+        Wraps a bound Database method so that its calls are measured.
+
+        Args:
+        db (Database): Database the method belongs to.
+        name (str): Method name used in the statistics.
+        method: Bound method to wrap.
+
+        Returns:
+        Wrapped method with the same signature.
+        """
+
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            stack = self._local.__dict__.setdefault('stack', [])
+            stack.append([])
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                statements = stack.pop()
+                if stack:
+                    stack[-1].extend(statements)
+                self.record(name, elapsed)
+                if elapsed >= self.slow_query_threshold:
+                    self._log_slow_call(db, name, elapsed, statements)
+
+        return wrapper
+
+
+    def record(self, name: str, elapsed: float) -> None:
+        """
+        Records one call of a method.
+
+        Args:
+        name (str): Method name.
+        elapsed (float): Duration of the call in seconds.
+        """
+
+        with self._lock:
+            method = self.methods.get(name)
+            if method is None:
+                method = self.methods[name] = {
+                    'calls': 0, 'total': 0.0, 'max': 0.0,
+                    'histogram': [0] * (len(self.BUCKETS) + 1)}
+            method['calls'] += 1
+            method['total'] += elapsed
+            method['max'] = max(method['max'], elapsed)
+            method['histogram'][bisect.bisect_left(self.BUCKETS,
+                                                   elapsed)] += 1
+
+
+    def _log_slow_call(self, db, name: str, elapsed: float,
+                       statements: list[str]) -> None:
+        """
+        Writes a slow call, its SQL and their query plans to the slow-query
+        log.
+
+        Args:
+        db (Database): Database the call was made on.
+        name (str): Method name.
+        elapsed (float): Duration of the call in seconds.
+        statements (list[str]): SQL statements run during the call.
+        """
+
+        with self._lock:
+            self.slow_calls += 1
+        if not self.slow_query_log:
+            return
+
+        lines = [f'{time.strftime("%Y-%m-%d %H:%M:%S")} {name} '
+                 f'{elapsed * 1000:.2f} ms']
+        for statement in statements:
+            lines.append(f'  SQL: {" ".join(statement.split())}')
+            for plan_line in self._explain(db, statement):
+                lines.append(f'    PLAN: {plan_line}')
+
+        with self._lock, open(self.slow_query_log, 'a',
+                              encoding='utf-8') as file:
+            file.write('\n'.join(lines) + '\n')
+
+
+    def _explain(self, db, statement: str) -> list[str]:
+        """
+        Gets the query plan of a traced statement.
+
+        Args:
+        db (Database): Database to explain the statement on.
+        statement (str): SQL with its parameters already expanded.
+
+        Returns:
+        list[str]: Query plan lines, empty for statements without a plan
+        (trigger markers, transaction control, pragmas).
+        """
+
+        keyword = statement.lstrip().split(' ', 1)[0].upper()
+        if keyword not in ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH'):
+            return []
+
+        connection = db.connection
+        connection.set_trace_callback(None)
+        try:
+            plan = connection.execute(
+                f'EXPLAIN QUERY PLAN {statement}').fetchall()
+        except Exception as error:
+            return [f'unavailable ({error})']
+        finally:
+            connection.set_trace_callback(self.trace)
+
+        return [detail for _, _, _, detail in plan]
+
+
+    def percentile(self, name: str, fraction: float) -> float:
+        """
+        Estimates a latency percentile of a method from its histogram.
+
+        Args:
+        name (str): Method name.
+        fraction (float): Percentile as a fraction, e.g. 0.99.
+
+        Returns:
+        float: Upper bound (in seconds) of the histogram bucket holding the
+        percentile; the maximum latency for the last bucket.
+        """
+
+        method = self.methods[name]
+        wanted = fraction * method['calls']
+        seen = 0
+        for bucket, amount in enumerate(method['histogram']):
+            seen += amount
+            if seen >= wanted and amount:
+                if bucket < len(self.BUCKETS):
+                    return min(self.BUCKETS[bucket], method['max'])
+                break
+
+        return method['max']
+
+
+    def format_summary(self) -> str:
+        """
+        Formats the collected statistics as a text table.
+
+        Returns:
+        str: One line per method, slowest total time first.
+        """
+
+        lines = [f'{"Method":<30}{"Calls":>8}{"Avg ms":>10}{"p50 ms":>10}'
+                 f'{"p99 ms":>10}{"Max ms":>10}']
+        with self._lock:
+            methods = sorted(self.methods.items(),
+                             key=lambda item: item[1]['total'], reverse=True)
+            for name, method in methods:
+                lines.append(
+                    f'{name:<30}{method["calls"]:>8}'
+                    f'{method["total"] / method["calls"] * 1000:>10.3f}'
+                    f'{self.percentile(name, 0.5) * 1000:>10.3f}'
+                    f'{self.percentile(name, 0.99) * 1000:>10.3f}'
+                    f'{method["max"] * 1000:>10.3f}')
+            lines.append(f'Slow calls (>= {self.slow_query_threshold * 1000:.0f}'
+                         f' ms): {self.slow_calls}')
+
+        return '\n'.join(lines)
@@ -0,0 +1,306 @@
+"""This file represents a load generator for the Library HTTP service"""
+import argparse
+import http.client
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import quote
+from benchmark import generate_books
+
+
+# Operation mapped to its weight in the generated request mix. Adds and
+# deletes only touch books added by the load generator itself.
+DEFAULT_MIX = {'search': 30, 'get': 30, 'list': 20, 'complete': 10,
+               'genres': 5, 'add': 3, 'delete': 2}
+
+
+class Client(threading.Thread):
+    """
+    Thread sending requests over one keep-alive connection until a deadline.
+
+    Latencies are recorded per operation in seconds, together with the
+    amount of failed requests (connection errors and 5xx answers).
+    """
+
+    def __init__(self, host: str, port: int, deadline: float, mix: dict,
+                 max_uid: int, keywords: list[str], seed: int) -> None:
+
+        super().__init__(daemon=True)
+        self.host = host
+        self.port = port
+        self.deadline = deadline
+        self.operations = list(mix)
+        self.cum_weights = []
+        for weight in mix.values():
+            self.cum_weights.append(weight + (self.cum_weights[-1]
+                                              if self.cum_weights else 0))
+        self.max_uid = max(max_uid, 1)
+        self.keywords = keywords
+        self.generator = random.Random(seed)
+        self.books = generate_books(10 ** 9, seed)
+        self.added_uids = []
+        self.timings = {operation: [] for operation in mix}
+        if 'delete' in mix:
+            self.timings.setdefault('add', [])
+        self.errors = 0
+        self.connection = http.client.HTTPConnection(host, port, timeout=30)
+
+
+    def _request(self, method: str, path: str,
+                 payload: dict = None) -> tuple[int, object]:
+        """Sends one request and reads the whole JSON answer."""
+
+        body, headers = None, {}
+        if payload is not None:
+            body = json.dumps(payload).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        self.connection.request(method, path, body, headers)
+        response = self.connection.getresponse()
+
+        return response.status, json.loads(response.read())
+
+
+    def _next_request(self, operation: str) -> tuple[str, str, dict]:
+        """Builds a random request of an operation."""
+
+        generator = self.generator
+        if operation == 'search':
+            keyword = quote(generator.choice(self.keywords))
+            return 'GET', f'/books/search?q={keyword}&limit=10', None
+        if operation == 'get':
+            return 'GET', f'/books/{generator.randint(1, self.max_uid)}', None
+        if operation == 'list':
+            after = generator.randint(0, self.max_uid)
+            return 'GET', f'/books?page_size=10&after={after}', None
+        if operation == 'complete':
+            prefix = generator.choice(self.keywords)[:generator.randint(1, 4)]
+            return 'GET', f'/books/complete?q={quote(prefix)}', None
+        if operation == 'genres':
+            return 'GET', '/genres', None
+        if operation == 'delete':
+            return 'DELETE', f'/books/{self.added_uids.pop()}', None
+
+        book = next(self.books)
+        return 'POST', '/books', {'title': book.title, 'author': book.author,
+                                  'description': book.description,
+                                  'genre': book.genre,
+                                  'amount_of_pages': book.amount_of_pages}
+
+
+    def run(self) -> None:
+
+        while time.perf_counter() < self.deadline:
+            operation = self.generator.choices(
+                self.operations, cum_weights=self.cum_weights)[0]
+            if operation == 'delete' and not self.added_uids:
+                # Nothing of our own to delete yet, a book is added instead.
+                operation = 'add'
+            method, path, payload = self._next_request(operation)
+            start = time.perf_counter()
+            try:
+                status, result = self._request(method, path, payload)
+            except (OSError, http.client.HTTPException, ValueError):
+                self.errors += 1
+                self.connection.close()
+                continue
+            self.timings[operation].append(time.perf_counter() - start)
+            if status >= 500:
+                self.errors += 1
+            elif method == 'POST' and status == 201:
+                self.added_uids.append(result['id'])
+
+        # Leaves the catalog as it was found.
+        for uid in self.added_uids:
+            try:
+                self._request('DELETE', f'/books/{uid}')
+            except (OSError, http.client.HTTPException, ValueError):
+                self.connection.close()
+        self.connection.close()
+
+
+def summarize(timings: list[float]) -> dict:
+    """
+    Summarizes request latencies.
+
+    Args:
+    timings (list[float]): Latencies in seconds.
+
+    Returns:
+    dict: {'requests': int, 'p50': float, 'p99': float, 'max': float},
+    latencies in seconds (None without requests).
+    """
+
+    if len(timings) < 2:
+        value = timings[0] if timings else None
+        return {'requests': len(timings), 'p50': value, 'p99': value,
+                'max': value}
+
+    percentiles = statistics.quantiles(timings, n=100, method='inclusive')
+
+    return {'requests': len(timings), 'p50': percentiles[49],
+            'p99': percentiles[98], 'max': max(timings)}
+
+
+def sample_catalog(host: str, port: int, seed: int,
+                   pages: int = 10) -> tuple[int, list[str]]:
+    """
+    Samples the served catalog for realistic request parameters.
+
+    Returns:
+    tuple[int, list[str]]: Largest book UID and words of the titles and
+    authors of a few random pages of books.
+    """
+
+    connection = http.client.HTTPConnection(host, port, timeout=30)
+    connection.request('GET', '/books?page_size=1&desc=1')
+    books = json.loads(connection.getresponse().read())['books']
+    max_uid = books[0]['id'] if books else 1
+
+    generator = random.Random(seed)
+    keywords = set()
+    for _ in range(pages):
+        connection.request('GET', f'/books?page_size=100&after='
+                                  f'{generator.randint(0, max_uid)}')
+        for book in json.loads(connection.getresponse().read())['books']:
+            keywords.update(f'{book["title"]} {book["author"]}'.split())
+    connection.close()
+
+    return max_uid, sorted(keywords) or ['book']
+
+
+def run_load(host: str, port: int, clients: int, duration: float,
+             mix: dict = None, seed: int = 0) -> dict:
+    """
+    Runs concurrent clients against a running service.
+
+    Args:
+    host (str): Address of the service.
+    port (int): Port of the service.
+    clients (int): Amount of concurrent clients, each with its own
+    keep-alive connection.
+    duration (float): Seconds to send requests for.
+    mix (dict): Operation mapped to its weight (default is DEFAULT_MIX).
+    seed (int): Seed of the random generators.
+
+    Returns:
+    dict: {'clients': int, 'duration': float, 'requests': int,
+    'errors': int, 'throughput': float, 'total': dict, 'operations': dict},
+    where total and every operation are summarize() results and throughput
+    is in requests per second.
+    """
+
+    mix = mix or DEFAULT_MIX
+    max_uid, keywords = sample_catalog(host, port, seed)
+
+    start = time.perf_counter()
+    workers = [Client(host, port, start + duration, mix, max_uid, keywords,
+                      seed + index) for index in range(clients)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+
+    operations = {operation: summarize([
+                      timing for worker in workers
+                      for timing in worker.timings[operation]])
+                  for operation in (workers[0].timings if workers else mix)}
+    total = summarize([timing for worker in workers
+                       for timings in worker.timings.values()
+                       for timing in timings])
+
+    return {'clients': clients, 'duration': elapsed,
+            'requests': total['requests'],
+            'errors': sum(worker.errors for worker in workers),
+            'throughput': total['requests'] / elapsed,
+            'total': total, 'operations': operations}
+
+
+def print_report(report: dict) -> None:
+    """Prints a run_load() report as a table."""
+
+    def milliseconds(value):
+        return f'{value * 1000:>9.2f}' if value is not None else f'{"-":>9}'
+
+    print(f'{report["clients"]} clients, {report["duration"]:.1f}s, '
+          f'{report["requests"]} requests, {report["errors"]} errors, '
+          f'{report["throughput"]:.0f} requests/s')
+    print(f'{"operation":<10} {"requests":>9} {"p50 ms":>9} {"p99 ms":>9} '
+          f'{"max ms":>9}')
+    for name, summary in [*report['operations'].items(),
+                          ('total', report['total'])]:
+        print(f'{name:<10} {summary["requests"]:>9} '
+              f'{milliseconds(summary["p50"])} {milliseconds(summary["p99"])} '
+              f'{milliseconds(summary["max"])}')
+
+
+def start_server(database_name: str,
+                 readers: int) -> tuple[subprocess.Popen, str, int]:
+    """
+    Starts server.py on a free localhost port.
+
+    Returns:
+    tuple[subprocess.Popen, str, int]: The server process, its address and
+    its port.
+    """
+
+    process = subprocess.Popen(
+        [sys.executable,
+         os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                      'server.py'), '--database', database_name,
+         '--port', '0', '--readers', str(readers)],
+        stdout=subprocess.PIPE, text=True)
+    line = process.stdout.readline()
+    if not line.startswith('Serving on http://'):
+        process.kill()
+        raise RuntimeError(f'Server did not start: {line!r}')
+    host, port = line.strip().removeprefix('Serving on http://').split(':')
+
+    return process, host, int(port)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Measure throughput and latency of the Library service.')
+    parser.add_argument('--host', default='127.0.0.1',
+                        help='address of a running service '
+                             '(default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8080,
+                        help='port of a running service (default: 8080)')
+    parser.add_argument('--database',
+                        help='start server.py on this database file instead '
+                             'of using a running service')
+    parser.add_argument('--readers', type=int, default=4,
+                        help='reader threads of the started server '
+                             '(default: 4)')
+    parser.add_argument('--clients', type=int, default=16,
+                        help='concurrent clients (default: 16)')
+    parser.add_argument('--duration', type=float, default=10,
+                        help='seconds to send requests for (default: 10)')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed of the request generators (default: 0)')
+    parser.add_argument('--output', help='also write the report as JSON')
+    args = parser.parse_args()
+
+    server_process = None
+    host, port = args.host, args.port
+    if args.database:
+        server_process, host, port = start_server(args.database,
+                                                  args.readers)
+    try:
+        report = run_load(host, port, args.clients, args.duration,
+                          seed=args.seed)
+    finally:
+        if server_process is not None:
+            server_process.terminate()
+            server_process.wait()
+
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2)
@@ -1,18 +1,49 @@
 """This file represents a library administration module"""
+import sys
 from db import Database
-from prettytable import PrettyTable as pt
 from book import Book
 from menu import Menu
+from page import BooksPage
+from table import TableRenderer
 
 
 class Library:
     """Class to manage a library of books."""
 
-    def __init__(self):
-        self.db = Database()
+    RENDERERS = ('fixed', 'prettytable')
+    SORT_OPTIONS = {'Relevance': 'rank', 'UID': 'id', 'Title': 'title',
+                    'Author': 'author', 'Genre': 'genre', 'Pages': 'pages'}
+
+    def __init__(self, db: Database = None, books_per_page: int = 10,
+                 renderer: str = 'prettytable'):
+        """
+        Args:
+        db (Database): Database of the library (default is database.db).
+        books_per_page (int): Amount of books shown on one page.
+        renderer (str): Book table renderer, 'prettytable' or 'fixed' for
+        the built-in fixed-width one.
+        """
+
+        if books_per_page < 1:
+            raise ValueError('books_per_page must be a positive number')
+        if renderer not in self.RENDERERS:
+            raise ValueError(f'Unknown renderer {renderer!r}, '
+                             f'expected one of {", ".join(self.RENDERERS)}')
+
+        self.db = db if db is not None else Database()
         self.menu_tools = Menu()
         self.BOOK_ATTRS = ['UID', 'Title', 'Author',
                            'Description', 'Genre', 'Pages']
+        self.BOOKS_PER_PAGE = books_per_page
+        self.GENRES_PER_PAGE = 10
+        self.renderer = renderer
+        # Relevance lists keyword searches best match first and every other
+        # listing by UID.
+        self.sort_by = 'rank'
+        self.sort_descending = False
+        self.table_renderer = TableRenderer(self.BOOK_ATTRS,
+                                            max_widths={1: 15, 3: 30},
+                                            right_aligned=(0, 5))
 
 
     def add_new_genre(self, genre: str):
@@ -34,22 +65,21 @@ class Library:
             print('Genre max. length is 64 symbols')
 
 
-    def add_new_book(self) -> None:
-        """Method to add a new book to the library."""
+    def add_new_book(self) -> int:
+        """
+        Method to add a new book to the library.
+
+        Returns:
+        int: UID of the added book, None if it could not be added.
+        """
 
         new_book = self.create_book_obj()
 
         try:
-            self.db.add_new_book(new_book)
-            self.db.commit_changes()
-            last_book_added = self.db.get_last_book_added()
-            if last_book_added[1] == new_book.title and last_book_added[5] == new_book.amount_of_pages:
-                print('Book added succesfuly, UID:', last_book_added[0])
-                return
-            else:
-                raise Exception(
-                    'Could not add a new book to DB. [FAILED ON RESULT CHECK]'
-                    )
+            with self.db.batch() as batch:
+                book_uid = batch.add_book(new_book)
+            print('Book added succesfuly, UID:', book_uid)
+            return book_uid
         except Exception:
             print('An error occured while performing this action.')
 
@@ -104,23 +134,145 @@ class Library:
         """
 
         pages = []
-        books_per_page = 10
+        books_per_page = self.BOOKS_PER_PAGE
 
         for i in range(0, len(all_books_list), books_per_page):
             books_for_page = all_books_list[i:i + books_per_page]
-            table = pt(self.BOOK_ATTRS)
-            for book_tuple in books_for_page:
-                book = list(book_tuple)
-                if len(book[3]) > 30:
-                    book[3] = f'{book[3][:30]}...'
-                if len(book[1]) > 15:
-                    book[1] = f'{book[1][:15]}...'
-                table.add_row(book)
-            pages.append(table)
+            pages.append(self._create_table_page(books_for_page))
 
         return pages
 
 
+    def _create_table_page(self, books_for_page) -> object:
+        """
+        Create a single table page for displaying books.
+
+        Args:
+        books_for_page: Books to be displayed on the page.
+
+        Returns:
+        str | PrettyTable: Rendered table with the given books, a PrettyTable
+        when the 'prettytable' renderer is selected.
+        """
+
+        if self.renderer == 'fixed':
+            return self.table_renderer.render(books_for_page)
+
+        from prettytable import PrettyTable as pt
+
+        table = pt(self.BOOK_ATTRS)
+        for book_tuple in books_for_page:
+            book = list(book_tuple)
+            if len(book[3]) > 30:
+                book[3] = f'{book[3][:30]}...'
+            if len(book[1]) > 15:
+                book[1] = f'{book[1][:15]}...'
+            table.add_row(book)
+
+        return table
+
+
+    def _print_table_page(self, books_for_page) -> None:
+        """
+        Print a single table page of books, writing the fixed-width table
+        straight to stdout.
+
+        Args:
+        books_for_page: Books to be displayed on the page.
+        """
+
+        if self.renderer == 'fixed':
+            self.table_renderer.write(books_for_page, sys.stdout)
+        else:
+            print(self._create_table_page(books_for_page))
+
+
+    def _get_books_page(self, **filters) -> BooksPage:
+        """
+        Fetch a page of books in the chosen sort order.
+
+        Args:
+        filters: Genre/keyword and page boundary arguments passed to
+        Database.get_books_page.
+
+        Returns:
+        BooksPage: Requested page, the first one without page boundaries.
+        """
+
+        return self.db.get_books_page(self.BOOKS_PER_PAGE,
+                                      sort_by=self.sort_by,
+                                      descending=self.sort_descending,
+                                      **filters)
+
+
+    def _turn_page(self, page: BooksPage, choosed_option: str,
+                   **filters) -> BooksPage:
+        """
+        Fetch the next or previous page depending on the chosen option.
+
+        Args:
+        page (BooksPage): Currently displayed page.
+        choosed_option (str): Menu option chosen by the user.
+        filters: Genre/keyword filters passed to Database.get_books_page.
+
+        Returns:
+        BooksPage: Page to display next (the same page for other options).
+        """
+
+        if "Next page" in choosed_option:
+            return self._get_books_page(after_uid=page.last_uid,
+                                        sort_value=page.last_value, **filters)
+        elif "Previous page" in choosed_option:
+            return self._get_books_page(before_uid=page.first_uid,
+                                        sort_value=page.first_value,
+                                        **filters)
+
+        return page
+
+
+    def _choose_sort_menu(self) -> None:
+        """
+        Let the user choose the column and direction book listings are
+        sorted by.
+        """
+
+        menu = self.menu_tools.create_menu(list(self.SORT_OPTIONS))
+        while True:
+            print('Sort books by:')
+            print(menu)
+            column = self.menu_tools.get_choosed_menu_option(menu,
+                                                             input('\n>> '))
+            if column:
+                break
+            print('Wrong option! Try something else.')
+
+        self.sort_by = self.SORT_OPTIONS[column]
+        self.sort_descending = not self._dialog('Ascending order?')
+
+
+    def _print_page_footer(self, current_page: int,
+                           keyword: str = None) -> None:
+        """
+        Print the page number and the sort order of a book listing.
+
+        Args:
+        current_page (int): Zero-based number of the displayed page.
+        keyword (str): Search keyword of the listing, if any. Listings
+        without one are never sorted by relevance.
+        """
+
+        current_sort_by = self.sort_by
+        if current_sort_by == 'rank' and keyword is None:
+            current_sort_by = 'id'
+        column = next(name for name, sort_by in self.SORT_OPTIONS.items()
+                      if sort_by == current_sort_by)
+        order = 'descending' if self.sort_descending else 'ascending'
+        if current_sort_by == 'rank':
+            order = ('worst match first' if self.sort_descending
+                     else 'best match first')
+        print(f'Page {current_page+1}, sorted by {column} ({order})\n')
+
+
     def create_book_obj(self) -> Book:
         """
         Method to create a new book object.
@@ -160,9 +312,9 @@ class Library:
         """
 
         if self._dialog('Delete book %d?', book_uid):
-            self.db.delete_book(book_uid)
-            self.db.commit_changes()
-            if not self.db.get_book_by_uid(book_uid):
+            with self.db.batch() as batch:
+                deleted = batch.delete_book(book_uid)
+            if deleted:
                 print('Book is deleted')
                 return True
             else:
@@ -200,9 +352,11 @@ class Library:
         static_menu_options = ['Add new book', 'Exit']
         dynamic_menu_options = []
 
-        if len(self.db.get_all_books()) != 0:
+        if not self.db.is_empty():
             for option in ['See all books', 'Delete certain book']:
                 dynamic_menu_options.append(option)
+        if self.db.stats is not None:
+            dynamic_menu_options.append('Query statistics')
 
         menu = self.menu_tools.create_menu(dynamic_menu_options, 
                                            static_menu_options)
@@ -213,9 +367,9 @@ class Library:
                                                     user_input_menu_option)
             if choosed_option:
                 if 'Add new book' in choosed_option:
-                    self.add_new_book()
-                    return self.certain_book_menu(
-                        self.db.get_last_book_added()[0])
+                    book_uid = self.add_new_book()
+                    if book_uid:
+                        return self.certain_book_menu(book_uid)
                 elif 'Exit' in choosed_option:
                     return exit()
 
@@ -225,6 +379,8 @@ class Library:
                         self.delete_book(book_uid)
                     elif 'See all books' in choosed_option:
                         return self.all_books_menu()
+                    elif 'Query statistics' in choosed_option:
+                        print(self.db.stats.format_summary())
                         
             else:
                 print('Wrong option! Try something else.')
@@ -234,6 +390,9 @@ class Library:
         """
         Method to choose a genre from the menu or add a new one.
 
+        Genres are shown one page at a time, and typing the beginning of a
+        genre name narrows the list down to the genres starting with it.
+
         Args:
         allow_add_new_genre (bool): Flag to allow adding a new genre.
 
@@ -241,12 +400,28 @@ class Library:
         str: Chosen (or added) genre.
         """
 
-        menu = self.menu_tools.create_menu(
-            [i[1] for i in self.db.get_all_genres()])
-        
+        prefix, offset = '', 0
+
         while True:
-            print(f'Existing genres:\n{menu}')
-            user_input_menu_option = input(f'''Choose one by typing in a digit{", or provide a new one:" if allow_add_new_genre else ":"}\n>> ''')
+            genres, has_more = self.db.get_genres_by_prefix(
+                prefix, self.GENRES_PER_PAGE, offset)
+            menu = self.menu_tools.create_menu([i[1] for i in genres])
+            print(f'Genres starting with "{prefix}":' if prefix
+                  else 'Existing genres:')
+            print(menu if genres else 'No such genres.\n')
+
+            hints = ['type in a digit to choose one',
+                     'letters to narrow the list down']
+            if has_more:
+                hints.append('">" for more')
+            if offset:
+                hints.append('"<" to go back')
+            if allow_add_new_genre:
+                hints.append('"+Name" to add a new genre')
+            hint = ', '.join(hints)
+            user_input_menu_option = input(
+                f'{hint[0].upper()}{hint[1:]}:\n>> ').strip()
+
             if user_input_menu_option.isdigit():
                 genre = self.menu_tools.get_choosed_menu_option(
                     menu, user_input_menu_option)
@@ -254,10 +429,19 @@ class Library:
                     return genre
                 else:
                     print('-'*50, 'Non-existing option!')
-            elif allow_add_new_genre:
-                return self.add_new_genre()
+            elif user_input_menu_option == '>' and has_more:
+                offset += self.GENRES_PER_PAGE
+            elif user_input_menu_option == '<' and offset:
+                offset -= self.GENRES_PER_PAGE
+            elif user_input_menu_option.startswith('+'):
+                if not allow_add_new_genre:
+                    print('Adding new genres is not allowed here')
+                    continue
+                genre = self.add_new_genre(user_input_menu_option[1:].strip())
+                if genre:
+                    return genre
             else:
-                print('Only digits allowed')
+                prefix, offset = user_input_menu_option, 0
 
 
     def certain_book_menu(self, book_uid: int):
@@ -293,6 +477,40 @@ class Library:
                 print('Wrong option! Try something else.')
 
 
+    def _choose_completion_menu(self, prefix: str) -> str:
+        """
+        Lets the user pick one of the titles and authors starting with a
+        prefix, narrowing the suggestions down as more letters are typed.
+
+        Args:
+        prefix (str): Beginning typed so far.
+
+        Returns:
+        str: The chosen title or author, empty if the user wants to type
+        the keyword again.
+        """
+
+        while True:
+            completions = self.db.autocomplete(prefix, self.BOOKS_PER_PAGE)
+            menu = self.menu_tools.create_menu(completions)
+            print(f'Titles and authors starting with "{prefix}":')
+            print(menu if completions else 'No suggestions.\n')
+            user_input_menu_option = input(
+                'Type in a digit to choose one, letters to narrow the list '
+                'down, nothing to type the keyword again:\n>> ').strip()
+
+            if not user_input_menu_option:
+                return ''
+            elif user_input_menu_option.isdigit():
+                completion = self.menu_tools.get_choosed_menu_option(
+                    menu, user_input_menu_option)
+                if completion:
+                    return completion
+                print('-'*50, 'Non-existing option!')
+            else:
+                prefix += user_input_menu_option.removesuffix('*')
+
+
     def search_menu(self):
         """
         Display a search menu to allow users to search for books by author or
@@ -310,32 +528,45 @@ class Library:
         the class to perform database operations and handle user interactions.
         """
 
-        print('''NOTICE: search will be performed between author and title of the book. \nMay not work properly if you use non-English letters.\n\n''')
+        print('''NOTICE: search will be performed between author and title of the book. \nEvery word of the keyword is matched as the beginning of a word.\n\n''')
         
         current_page = 0
 
         while True:
-            search_keyword = input('Search keyword\n>> ')
-            search_result = self.db.search(search_keyword)
-            if not search_result:
-                print('No books matching this keyword were found, try again')
-            else:
+            search_keyword = input('Search keyword (end it with "*" for '
+                                   'title and author suggestions)\n>> ')
+            if search_keyword.endswith('*'):
+                search_keyword = self._choose_completion_menu(
+                    search_keyword[:-1])
+                if not search_keyword:
+                    continue
+            page = self._get_books_page(keyword=search_keyword)
+            if page.books:
                 break
 
-        table_pages = self._create_table_pages(search_result)
+            similar_books = self.db.fuzzy_search(search_keyword,
+                                                 self.BOOKS_PER_PAGE)
+            if similar_books:
+                print('No books matching this keyword were found. '
+                      'Did you mean one of these?')
+                self._print_table_page(similar_books)
+                print('Try again, e.g. with the title or author from above')
+            else:
+                print('No books matching this keyword were found, try again')
+
         static_menu_options = ['Select certain book', 'Delete certain book',
-            'Go back to main menu', 'Change keyword', 'Exit']
+            'Sort books', 'Go back to main menu', 'Change keyword', 'Exit']
         
         while True:
             dynamic_menu_options = []
-            if current_page+1 < len(table_pages):
+            if page.has_next:
                 dynamic_menu_options.append('Next page')
-            if len(table_pages) > 1 and current_page+1 > 1:
+            if page.has_prev:
                 dynamic_menu_options.append('Previous page')
             menu = self.menu_tools.create_menu(dynamic_menu_options,
                                                static_menu_options)
-            print(table_pages[current_page])
-            print(f'Page {current_page+1}/{len(table_pages)}\n')
+            self._print_table_page(page.books)
+            self._print_page_footer(current_page, search_keyword)
             print(menu)
             user_input_menu_option = input('\n>> ')
             choosed_option = self.menu_tools.get_choosed_menu_option(menu,
@@ -349,6 +580,11 @@ class Library:
                     book_uid = self._get_book_uid_input()
                     self.delete_book(book_uid)
                     pass
+                elif 'Sort books' in choosed_option:
+                    self._choose_sort_menu()
+                    page = self._get_books_page(keyword=search_keyword)
+                    current_page = 0
+                    continue
                 elif 'Go back to main menu' in choosed_option:
                     return self.main_menu()
                 elif 'Change keyword' in choosed_option:
@@ -361,6 +597,8 @@ class Library:
                         current_page += 1
                     elif "Previous page" in choosed_option:
                         current_page -= 1
+                    page = self._turn_page(page, choosed_option,
+                                           keyword=search_keyword)
             else:
                 print('Wrong option! Try something else.')     
 
@@ -385,27 +623,26 @@ class Library:
         while True:
             genre = self._choose_genre_menu(allow_add_new_genre=False)
             print(genre)
-            all_books_list = self.db.get_all_books_by_genre(genre)
-            if not all_books_list:
+            page = self._get_books_page(genre=genre)
+            if not page.books:
                 print('No books with choosen genre found, try another one')
             else:
                 break
 
         current_page = 0
-        pages = self._create_table_pages(all_books_list)   
         static_menu_options = ['Select certain book', 'Delete certain book',
-                               'Go back to main menu', 'Change filter',
-                               'Exit']
+                               'Sort books', 'Go back to main menu',
+                               'Change filter', 'Exit']
         while True:
             dynamic_menu_options = []
-            if current_page+1 < len(pages):
+            if page.has_next:
                 dynamic_menu_options.append('Next page')
-            if len(pages) > 1 and current_page+1 > 1:
+            if page.has_prev:
                 dynamic_menu_options.append('Previous page')
             menu = self.menu_tools.create_menu(dynamic_menu_options,
                                                static_menu_options)
-            print(pages[current_page])
-            print(f'Page {current_page+1}/{len(pages)}\n')
+            self._print_table_page(page.books)
+            self._print_page_footer(current_page)
             print(menu)
             user_input_menu_option = input('\n>> ')
             choosed_option = self.menu_tools.get_choosed_menu_option(
@@ -418,6 +655,11 @@ class Library:
                 elif 'Delete certain book' in choosed_option:
                     book_uid = self._get_book_uid_input()
                     self.delete_book(book_uid)
+                elif 'Sort books' in choosed_option:
+                    self._choose_sort_menu()
+                    page = self._get_books_page(genre=genre)
+                    current_page = 0
+                    continue
                 elif 'Go back to main menu' in choosed_option:
                     return self.main_menu()
                 elif 'Change filter' in choosed_option:
@@ -430,14 +672,15 @@ class Library:
                         current_page += 1
                     elif "Previous page" in choosed_option:
                         current_page -= 1
+                    page = self._turn_page(page, choosed_option, genre=genre)
             else:
                 print('Wrong option! Try something else.')
 
 
     def all_books_menu(self) -> None:
         """
-        The method retrieves all books from the database and paginates the
-        data to display it in a user-friendly format.
+        The method retrieves books from the database one page at a time and
+        displays them in a user-friendly format.
 
         It then presents a menu with options for the user to interact with
         the list of books.
@@ -450,21 +693,21 @@ class Library:
         """
 
         current_page = 0
-        all_books_list = self.db.get_all_books()
-        pages = self._create_table_pages(all_books_list)
+        page = self._get_books_page()
         static_menu_options = ['Select certain book', 'Delete certain book',
-                               'Search by keyword', 'Filter by genre',
-                               'Go back to main menu', 'Exit']
+                               'Sort books', 'Search by keyword',
+                               'Filter by genre', 'Go back to main menu',
+                               'Exit']
         while True:
             dynamic_menu_options = []
-            if current_page+1 < len(pages):
+            if page.has_next:
                 dynamic_menu_options.append('Next page')
-            if len(pages) > 1 and current_page+1 > 1:
+            if page.has_prev:
                 dynamic_menu_options.append('Previous page')
             menu = self.menu_tools.create_menu(dynamic_menu_options,
                                                static_menu_options)
-            print(pages[current_page])
-            print(f'Page {current_page+1}/{len(pages)}\n')
+            self._print_table_page(page.books)
+            self._print_page_footer(current_page)
             print(menu)
             user_input_menu_option = input('\n>> ')
             choosed_option = self.menu_tools.get_choosed_menu_option(
@@ -477,6 +720,11 @@ class Library:
                 elif 'Delete certain book' in choosed_option:
                     book_uid = self._get_book_uid_input()
                     self.delete_book(book_uid)
+                elif 'Sort books' in choosed_option:
+                    self._choose_sort_menu()
+                    page = self._get_books_page()
+                    current_page = 0
+                    continue
                 elif 'Search by keyword' in choosed_option:
                     return self.search_menu()
                 elif 'Filter by genre' in choosed_option:
@@ -491,10 +739,50 @@ class Library:
                         current_page += 1
                     elif "Previous page" in choosed_option:
                         current_page -= 1
+                    page = self._turn_page(page, choosed_option)
             else:
                 print('Wrong option! Try something else.')
 
 
 if __name__ == '__main__':
-    lib = Library()
-    lib.main_menu()
+    import argparse
+    from instrumentation import QueryStats
+    from sharded import ShardedDatabase
+
+    parser = argparse.ArgumentParser(description='Library administration.')
+    parser.add_argument('--profile', action='store_true',
+                        help='record query statistics and print them on exit')
+    parser.add_argument('--slow-query-threshold', type=float, default=100,
+                        help='slow-query log threshold in ms (default: 100)')
+    parser.add_argument('--slow-query-log', default='slow_queries.log',
+                        help='slow-query log file (default: slow_queries.log)')
+    parser.add_argument('--page-size', type=int, default=10,
+                        help='amount of books per page (default: 10)')
+    parser.add_argument('--renderer', choices=Library.RENDERERS,
+                        default='prettytable',
+                        help='book table renderer (default: prettytable)')
+    parser.add_argument('--shards', type=int, default=0,
+                        help='spread the catalog over this many database '
+                             'files (default: 0, a single database.db)')
+    parser.add_argument('--partition', choices=ShardedDatabase.PARTITIONS,
+                        default='id',
+                        help='how books are spread over the shards '
+                             '(default: id)')
+    args = parser.parse_args()
+
+    stats = None
+    if args.profile:
+        stats = QueryStats(args.slow_query_threshold / 1000,
+                           args.slow_query_log)
+
+    if args.shards:
+        db = ShardedDatabase(shards=args.shards, partition=args.partition,
+                             stats=stats)
+    else:
+        db = Database(stats=stats)
+    lib = Library(db, books_per_page=args.page_size, renderer=args.renderer)
+    try:
+        lib.main_menu()
+    finally:
+        if stats is not None:
+            print(stats.format_summary())
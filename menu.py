@@ -1,15 +1,43 @@
 
+class MenuOptions:
+    """
+    Text-based menu rendered once, with its options indexed by the number
+    the user types to choose them.
+    """
+
+    __slots__ = ('options', 'rendered')
+
+    def __init__(self, menu_options: list[str]):
+        self.options = {str(option_index): menu_option
+                        for option_index, menu_option
+                        in enumerate(menu_options, start=1)}
+        self.rendered = '\n' + ''.join(
+            f'{option_index}. {menu_option}\n'
+            for option_index, menu_option in self.options.items())
+
+    def __str__(self) -> str:
+        return self.rendered
+
+    def __len__(self) -> int:
+        return len(self.options)
+
+
 class Menu:
     """
     Class to create and manage a text-based menu.
     """
+
+    MAX_CACHED_MENUS = 256
+
     def __init__(self):
-        pass
+        self._menus = {}
 
     def create_menu(self, dynamic_options: list[str] = None,
-                    static_options: list[str] = None) -> str:
+                    static_options: list[str] = None) -> MenuOptions:
         """
         Create a text-based menu with the given dynamic and static options.
+        Menus are cached, so asking again for the same options returns the
+        already rendered menu.
 
         Args:
         dynamic_options (list[str]): List of dynamic options to be
@@ -18,45 +46,31 @@ class Menu:
         included in the menu.
 
         Returns:
-        str: Text-based menu string.
+        MenuOptions: Text-based menu, printable as is.
         """
-        menu = '\n'
-        menu_options = []
-
-        if dynamic_options:
-            for dynamic_option in dynamic_options:
-                menu_options.append(dynamic_option)
-        if static_options:
-            for static_option in static_options:
-                menu_options.append(static_option)
+        menu_options = tuple(dynamic_options or ()) + \
+            tuple(static_options or ())
 
-        option_index = 1
-        for menu_option in menu_options:
-            menu = menu + f'{option_index}. {menu_option}\n'
-            option_index += 1
+        menu = self._menus.get(menu_options)
+        if menu is None:
+            if len(self._menus) >= self.MAX_CACHED_MENUS:
+                self._menus.clear()
+            menu = self._menus[menu_options] = MenuOptions(menu_options)
 
         return menu
-    
-    def get_choosed_menu_option(self, menu: str, choosed_option: str) -> str:
+
+    def get_choosed_menu_option(self, menu: MenuOptions,
+                                choosed_option: str) -> str:
         """
         Get the chosen menu option based on user input.
         If option doesn't exist in provided option an empty string will be
         returned.
 
         Args:
-        menu (str): Text-based menu string.
+        menu (MenuOptions): Text-based menu.
         choosed_option (str): User's chosen option.
 
         Returns:
         str: Chosen menu option.
         """
-        if choosed_option in menu:
-            user_input_menu_option_index = menu.find(choosed_option)
-            choosed_option = (
-                menu[user_input_menu_option_index+3:menu.find('\n',
-                                                              user_input_menu_option_index)]
-                                                              )
-            return choosed_option
-        else:
-            return ''
-    
\ No newline at end of file
+        return menu.options.get(choosed_option.strip(), '')
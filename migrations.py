@@ -0,0 +1,179 @@
+"""Versioned schema migrations for the Library database"""
+import sqlite3
+import db_templates
+import fuzzy
+
+
+def create_tables(cursor: sqlite3.Cursor) -> None:
+    """Creates the books and genres tables and seeds the initial genres."""
+
+    cursor.execute(db_templates.books_table)
+    cursor.execute(db_templates.genres_table)
+    cursor.executemany("INSERT OR IGNORE INTO genres (genre_name) VALUES (?)",
+                       [(genre,) for genre in db_templates.initial_genres])
+
+
+def normalize_genres(cursor: sqlite3.Cursor) -> None:
+    """
+    Migrates books storing the genre name as free text to books referencing
+    genres by id.
+
+    Genres used by books but missing in the genres table are added to it,
+    books are copied into the normalized table (keeping their UIDs) and the
+    statistics are dropped, so that a later migration recomputes them.
+    Databases created with the normalized layout are left untouched.
+    """
+
+    cursor.execute("SELECT name FROM pragma_table_info('books')")
+    if ('genre',) not in cursor.fetchall():
+        return
+
+    for query in db_templates.books_genre_normalization:
+        cursor.execute(query)
+
+
+def create_genre_indexes(cursor: sqlite3.Cursor) -> None:
+    """Creates the genre indexes and the books_view joining genre names."""
+
+    cursor.execute(db_templates.books_genre_index)
+    cursor.execute(db_templates.genres_name_index)
+    cursor.execute(db_templates.books_view)
+
+
+def create_search_index(cursor: sqlite3.Cursor) -> None:
+    """
+    Creates the full-text search index over books, the triggers keeping it
+    in sync and fills it from the books already stored.
+    """
+
+    cursor.execute(db_templates.books_fts_table)
+    for trigger in db_templates.books_fts_triggers:
+        cursor.execute(trigger)
+    cursor.execute(db_templates.books_fts_rebuild)
+
+
+def create_statistics(cursor: sqlite3.Cursor) -> None:
+    """
+    Creates the catalog statistics tables, the triggers keeping them up to
+    date and computes them from the books already stored.
+    """
+
+    cursor.execute(db_templates.books_stats_table)
+    cursor.execute(db_templates.genre_stats_table)
+    cursor.execute(db_templates.books_pages_index)
+    for trigger in db_templates.books_stats_triggers:
+        cursor.execute(trigger)
+
+    cursor.execute("DELETE FROM books_stats")
+    cursor.execute("DELETE FROM genre_stats")
+    for query in db_templates.books_stats_fill:
+        cursor.execute(query)
+
+
+def create_sort_indexes(cursor: sqlite3.Cursor) -> None:
+    """
+    Creates the indexes backing sorted book listings, with and without the
+    genre filter.
+    """
+
+    for index in db_templates.books_sort_indexes:
+        cursor.execute(index)
+
+
+def create_trigram_index(cursor: sqlite3.Cursor) -> None:
+    """
+    Creates the trigram index of the fuzzy search with its per-trigram
+    statistics and fills them from the books already stored. Later changes
+    to the books are indexed by Database itself, as trigrams are computed
+    in Python, while triggers keep the statistics up to date.
+    """
+
+    cursor.execute(db_templates.book_trigrams_table)
+    cursor.execute(db_templates.book_trigram_stats_table)
+
+    books = cursor.connection.execute('SELECT id, title, author FROM books')
+    try:
+        cursor.executemany(
+            'INSERT OR IGNORE INTO book_trigrams (trigram, book_id) '
+            'VALUES (?, ?)', fuzzy.book_trigram_rows(books))
+    finally:
+        books.close()
+
+    cursor.execute('DELETE FROM book_trigram_stats')
+    cursor.execute(db_templates.book_trigram_stats_fill)
+    for trigger in db_templates.book_trigram_stats_triggers:
+        cursor.execute(trigger)
+
+
+def create_change_log(cursor: sqlite3.Cursor) -> None:
+    """
+    Creates the change log with the triggers recording every change of the
+    books and genres from now on. Rows stored before are not logged, so
+    consumers start from a full read (see Database.get_last_change_seq()).
+    """
+
+    cursor.execute(db_templates.change_log_table)
+    cursor.execute(db_templates.change_log_state_table)
+    cursor.execute(db_templates.change_log_state_fill)
+    for trigger in db_templates.change_log_triggers:
+        cursor.execute(trigger)
+
+
+# Ordered migrations: the database is at version N once the first N of them
+# have been applied. Append new migrations, never reorder or edit applied
+# ones. Databases created before versioning (user_version 0) may already
+# hold any part of the schema, so early migrations are idempotent.
+MIGRATIONS = [create_tables,
+              normalize_genres,
+              create_genre_indexes,
+              create_search_index,
+              create_statistics,
+              create_sort_indexes,
+              create_trigram_index,
+              create_change_log]
+
+LATEST_VERSION = len(MIGRATIONS)
+
+
+def get_version(connection: sqlite3.Connection) -> int:
+    """Gets the schema version stored in PRAGMA user_version."""
+
+    return connection.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(connection: sqlite3.Connection) -> int:
+    """
+    Applies every migration the database has not been through yet.
+
+    Args:
+    connection (sqlite3.Connection): Connection to the database without an
+    open transaction.
+
+    Returns:
+    int: Amount of applied migrations.
+
+    Behavior:
+    Each migration runs in its own IMMEDIATE transaction together with the
+    user_version bump, so an interrupted migration is rolled back and
+    retried on the next start, and two processes never apply the same
+    migration twice.
+    """
+
+    applied = 0
+    while get_version(connection) < LATEST_VERSION:
+        cursor = connection.cursor()
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            version = get_version(connection)
+            if version < LATEST_VERSION:
+                MIGRATIONS[version](cursor)
+                cursor.execute(f'PRAGMA user_version = {version + 1}')
+                applied += 1
+            connection.commit()
+        except BaseException:
+            connection.rollback()
+            raise
+        finally:
+            cursor.close()
+
+    return applied
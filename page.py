@@ -0,0 +1,47 @@
+"""A page of books for Library listings"""
+
+class BooksPage:
+
+    def __init__(self, books: list[tuple], has_next: bool,
+                 has_prev: bool, sort_index: int = 0) -> None:
+
+        self.books = books
+        self.has_next = has_next
+        self.has_prev = has_prev
+        self.sort_index = sort_index
+
+    @property
+    def first_uid(self) -> int:
+        """UID of the first book on the page, None for an empty page."""
+
+        return self.books[0][0] if self.books else None
+
+    @property
+    def last_uid(self) -> int:
+        """UID of the last book on the page, None for an empty page."""
+
+        return self.books[-1][0] if self.books else None
+
+    @property
+    def first_value(self) -> object:
+        """
+        Sort column value of the first book, None for an empty page or a
+        sort column that book rows do not hold.
+        """
+
+        if not self.books or self.sort_index is None:
+            return None
+
+        return self.books[0][self.sort_index]
+
+    @property
+    def last_value(self) -> object:
+        """
+        Sort column value of the last book, None for an empty page or a
+        sort column that book rows do not hold.
+        """
+
+        if not self.books or self.sort_index is None:
+            return None
+
+        return self.books[-1][self.sort_index]
@@ -0,0 +1,418 @@
+"""This file represents a JSON over HTTP service for the Library"""
+import argparse
+import asyncio
+import json
+import re
+import sys
+import traceback
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+from async_db import AsyncDatabase
+from cli import book_to_dict
+from importer import validate_row
+
+
+class HTTPError(Exception):
+    """Error answered with an HTTP status and a JSON {"error": ...} body."""
+
+    def __init__(self, status: HTTPStatus, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+class Request:
+    """Parsed HTTP request."""
+
+    __slots__ = ('method', 'path', 'query', 'headers', 'body', 'keep_alive')
+
+    def __init__(self, method: str, target: str, version: str,
+                 headers: dict, body: bytes) -> None:
+
+        url = urlsplit(target)
+        self.method = method
+        self.path = url.path.rstrip('/') or '/'
+        self.query = {name: values[-1] for name, values
+                      in parse_qs(url.query).items()}
+        self.headers = headers
+        self.body = body
+        connection = headers.get('connection', '').lower()
+        # HTTP/1.1 connections are persistent unless closed explicitly.
+        self.keep_alive = (connection != 'close' if version == 'HTTP/1.1'
+                           else connection == 'keep-alive')
+
+
+class LibraryServer:
+    """
+    Class serving the Library catalog as JSON over HTTP/1.1.
+
+    Every connection is handled by its own task and kept alive between
+    requests. Database calls go through AsyncDatabase, so reads run
+    concurrently on its reader threads while adds and deletes are
+    serialized on its single writer thread.
+
+    Endpoints:
+    GET /books?page_size=&after=&before=&genre=&keyword=&sort=&desc=
+    GET /books/search?q=&genre=&full_text=&fuzzy=&limit=
+    GET /books/complete?q=&limit=
+    GET /books/<uid>
+    POST /books with a JSON book {"title", "author", "description",
+    "genre", "amount_of_pages"}
+    DELETE /books/<uid>
+    GET /genres?prefix=&limit=
+    GET /changes?since=&limit=
+    """
+
+    # Longest accepted request or header line and request body, in bytes.
+    MAX_LINE = 8192
+    MAX_BODY = 65536
+
+    # Seconds a connection may take to send a request before it is closed,
+    # which also ends idle keep-alive connections.
+    REQUEST_TIMEOUT = 30
+
+    # Largest page or amount of search results returned at once.
+    MAX_LIMIT = 1000
+
+    def __init__(self, db: AsyncDatabase) -> None:
+        """
+        Args:
+        db (AsyncDatabase): Database the requests are served from.
+        """
+
+        self.db = db
+        self.routes = [
+            ('GET', re.compile(r'/books'), self.list_books),
+            ('GET', re.compile(r'/books/search'), self.search),
+            ('GET', re.compile(r'/books/complete'), self.complete),
+            ('GET', re.compile(r'/books/(\d+)'), self.get_book),
+            ('POST', re.compile(r'/books'), self.add_book),
+            ('DELETE', re.compile(r'/books/(\d+)'), self.delete_book),
+            ('GET', re.compile(r'/genres'), self.list_genres),
+            ('GET', re.compile(r'/changes'), self.list_changes),
+        ]
+
+
+    async def handle_connection(self, reader: asyncio.StreamReader,
+                                writer: asyncio.StreamWriter) -> None:
+        """
+        Answers the requests of one connection until it is closed.
+
+        Args:
+        reader (asyncio.StreamReader): Incoming side of the connection.
+        writer (asyncio.StreamWriter): Outgoing side of the connection.
+        """
+
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(
+                        self._read_request(reader), self.REQUEST_TIMEOUT)
+                except HTTPError as error:
+                    writer.write(self._format_response(
+                        error.status, {'error': str(error)}, False))
+                    await writer.drain()
+                    return
+                if request is None:
+                    return
+
+                status, result = await self._dispatch(request)
+                writer.write(self._format_response(status, result,
+                                                   request.keep_alive))
+                await writer.drain()
+                if not request.keep_alive:
+                    return
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError,
+                ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Request:
+        """
+        Reads one request from a connection.
+
+        Returns:
+        Request: The request, None if the client closed the connection
+        before sending one.
+
+        Raises:
+        HTTPError: If the request is malformed or too large.
+        """
+
+        try:
+            line = await reader.readline()
+            if not line:
+                return None
+            try:
+                method, target, version = line.decode('latin-1').split()
+            except ValueError:
+                raise HTTPError(HTTPStatus.BAD_REQUEST,
+                                'Malformed request line')
+
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+        except ValueError:
+            # Raised by the reader for lines longer than its limit.
+            raise HTTPError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE,
+                            'Request line or header too long')
+
+        try:
+            length = int(headers.get('content-length', 0))
+        except ValueError:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, 'Invalid Content-Length')
+        if not 0 <= length <= self.MAX_BODY:
+            raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                            'Request body too large')
+        body = await reader.readexactly(length) if length else b''
+
+        return Request(method.upper(), target, version.upper(), headers, body)
+
+
+    async def _dispatch(self, request: Request) -> tuple[HTTPStatus, object]:
+        """
+        Runs the handler of a request.
+
+        Returns:
+        tuple[HTTPStatus, object]: Response status and JSON-ready result.
+        LookupError is answered with 404, ValueError with 400 and any other
+        exception with 500.
+        """
+
+        allowed_methods = []
+        for method, pattern, handler in self.routes:
+            match = pattern.fullmatch(request.path)
+            if not match:
+                continue
+            if method != request.method:
+                allowed_methods.append(method)
+                continue
+
+            try:
+                return await handler(request, *match.groups())
+            except HTTPError as error:
+                return error.status, {'error': str(error)}
+            except LookupError as error:
+                return HTTPStatus.NOT_FOUND, {'error': str(error)}
+            except ValueError as error:
+                return HTTPStatus.BAD_REQUEST, {'error': str(error)}
+            except Exception:
+                traceback.print_exc()
+                return (HTTPStatus.INTERNAL_SERVER_ERROR,
+                        {'error': 'Internal server error'})
+
+        if allowed_methods:
+            return (HTTPStatus.METHOD_NOT_ALLOWED,
+                    {'error': f'Use {", ".join(allowed_methods)}'})
+
+        return HTTPStatus.NOT_FOUND, {'error': f'No such path {request.path}'}
+
+
+    @staticmethod
+    def _format_response(status: HTTPStatus, result: object,
+                         keep_alive: bool) -> bytes:
+        """Encodes a JSON response with its status line and headers."""
+
+        body = json.dumps(result, ensure_ascii=False).encode('utf-8')
+        head = (f'HTTP/1.1 {status.value} {status.phrase}\r\n'
+                f'Content-Type: application/json; charset=utf-8\r\n'
+                f'Content-Length: {len(body)}\r\n'
+                f'Connection: {"keep-alive" if keep_alive else "close"}\r\n'
+                f'\r\n')
+
+        return head.encode('latin-1') + body
+
+
+    @staticmethod
+    def _int_param(request: Request, name: str, default: int = None) -> int:
+        """Gets a non-negative integer query parameter."""
+
+        value = request.query.get(name)
+        if value is None:
+            return default
+        if not value.isdigit():
+            raise ValueError(f'{name} must be a non-negative integer')
+
+        return int(value)
+
+
+    def _limit_param(self, request: Request, name: str,
+                     default: int) -> int:
+        """Gets an amount of results, at most MAX_LIMIT."""
+
+        return min(self._int_param(request, name, default), self.MAX_LIMIT)
+
+
+    @staticmethod
+    def _flag_param(request: Request, name: str) -> bool:
+        """Gets a boolean query parameter such as ?fuzzy=1."""
+
+        return request.query.get(name, '').lower() in ('1', 'true', 'yes')
+
+
+    async def list_books(self, request: Request) -> tuple[HTTPStatus, object]:
+        """Lists one page of books, see Database.get_books_page."""
+
+        page = await self.db.get_books_page(
+            self._limit_param(request, 'page_size', 10),
+            after_uid=self._int_param(request, 'after'),
+            before_uid=self._int_param(request, 'before'),
+            genre=request.query.get('genre'),
+            keyword=request.query.get('keyword'),
+            sort_by=request.query.get('sort', 'id'),
+            descending=self._flag_param(request, 'desc'))
+
+        return HTTPStatus.OK, {'books': [book_to_dict(book)
+                                         for book in page.books],
+                               'has_next': page.has_next,
+                               'has_prev': page.has_prev}
+
+
+    async def search(self, request: Request) -> tuple[HTTPStatus, object]:
+        """Searches books by keyword, optionally within a genre."""
+
+        keyword = request.query.get('q', '')
+        if not keyword.strip():
+            raise ValueError('q must not be empty')
+        limit = self._limit_param(request, 'limit', 50)
+        if self._flag_param(request, 'fuzzy'):
+            books = await self.db.fuzzy_search(keyword, limit)
+        elif self._flag_param(request, 'full_text'):
+            books = await self.db.search_full_text(keyword, limit=limit)
+        elif request.query.get('genre'):
+            books = (await self.db.get_books_page(
+                limit, genre=request.query['genre'], keyword=keyword,
+                sort_by='rank')).books
+        else:
+            books = await self.db.search(keyword, limit)
+
+        return HTTPStatus.OK, [book_to_dict(book) for book in books]
+
+
+    async def complete(self, request: Request) -> tuple[HTTPStatus, object]:
+        """Completes the beginning of a title or author."""
+
+        completions = await self.db.autocomplete(
+            request.query.get('q', ''),
+            self._limit_param(request, 'limit', 10))
+
+        return HTTPStatus.OK, completions
+
+
+    async def get_book(self, request: Request,
+                       uid: str) -> tuple[HTTPStatus, object]:
+        """Gets a single book by its UID."""
+
+        book = await self.db.get_book_by_uid(int(uid))
+        if not book:
+            raise LookupError(f'Book {uid} does not exist')
+
+        return HTTPStatus.OK, book_to_dict(book)
+
+
+    async def add_book(self, request: Request) -> tuple[HTTPStatus, object]:
+        """Validates and adds a new book, answering with its UID."""
+
+        try:
+            row = json.loads(request.body or b'null')
+        except ValueError:
+            raise ValueError('Request body must be a JSON object')
+        if not isinstance(row, dict):
+            raise ValueError('Request body must be a JSON object')
+
+        genres = {genre[1] for genre in await self.db.get_all_genres()}
+        book, reason = validate_row(row, genres)
+        if not book:
+            raise ValueError(reason)
+
+        return HTTPStatus.CREATED, {'id': await self.db.add_new_book(book)}
+
+
+    async def delete_book(self, request: Request,
+                          uid: str) -> tuple[HTTPStatus, object]:
+        """Deletes a book by its UID."""
+
+        if not await self.db.delete_book(int(uid)):
+            raise LookupError(f'Book {uid} does not exist')
+
+        return HTTPStatus.OK, {'id': int(uid), 'deleted': 1}
+
+
+    async def list_genres(self, request: Request) -> tuple[HTTPStatus, object]:
+        """Lists genre names, optionally starting with a prefix."""
+
+        genres, _ = await self.db.get_genres_by_prefix(
+            request.query.get('prefix', ''),
+            self._limit_param(request, 'limit', self.MAX_LIMIT))
+
+        return HTTPStatus.OK, [genre_name for _, genre_name in genres]
+
+
+    async def list_changes(self,
+                           request: Request) -> tuple[HTTPStatus, object]:
+        """
+        Reads the change log after a sequence number, answering 410 Gone
+        if the client has to read the catalog again.
+        """
+
+        try:
+            changes = await self.db.get_changes(
+                self._int_param(request, 'since', 0),
+                self._limit_param(request, 'limit', self.MAX_LIMIT))
+        except LookupError as error:
+            raise HTTPError(HTTPStatus.GONE, str(error))
+
+        return HTTPStatus.OK, [
+            {'seq': seq, 'table': table_name, 'operation': operation,
+             'row_id': row_id, 'data': data, 'changed_at': changed_at}
+            for seq, table_name, operation, row_id, data, changed_at
+            in changes]
+
+
+async def serve(database_name: str, host: str = '127.0.0.1',
+                port: int = 8080, max_readers: int = 4) -> None:
+    """
+    Serves the Library until cancelled.
+
+    Args:
+    database_name (str): Path of the SQLite database file.
+    host (str): Address to listen on.
+    port (int): Port to listen on, 0 picks a free one.
+    max_readers (int): Amount of database reader threads.
+    """
+
+    async with AsyncDatabase(database_name, max_readers) as db:
+        # Loads the autocomplete index before the first client waits for it.
+        await db.autocomplete('')
+        library_server = LibraryServer(db)
+        server = await asyncio.start_server(
+            library_server.handle_connection, host, port,
+            limit=LibraryServer.MAX_LINE)
+        address = server.sockets[0].getsockname()
+        print(f'Serving on http://{address[0]}:{address[1]}', flush=True)
+        async with server:
+            await server.serve_forever()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Serve the Library catalog as JSON over HTTP.')
+    parser.add_argument('--database', default='database.db',
+                        help='SQLite database file (default: database.db)')
+    parser.add_argument('--host', default='127.0.0.1',
+                        help='address to listen on (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8080,
+                        help='port to listen on (default: 8080)')
+    parser.add_argument('--readers', type=int, default=4,
+                        help='database reader threads (default: 4)')
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args.database, args.host, args.port, args.readers))
+    except KeyboardInterrupt:
+        sys.exit(0)
@@ -0,0 +1,718 @@
+"""This file represents a Library catalog sharded across SQLite files"""
+import contextlib
+import heapq
+import multiprocessing
+import os
+import string
+import threading
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain, islice
+from typing import Iterable, Iterator
+from autocomplete import PrefixIndex
+from batch import WriteBatch
+from book import Book
+from cache import LRUCache
+from db import Database, cached_lookup
+from instrumentation import QueryStats
+from page import BooksPage
+import fuzzy
+
+
+# Lowercases ASCII letters only, as SQLite's NOCASE collation does.
+NOCASE = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+RANKED_SEARCH_QUERY = """
+SELECT books_fts.rank, books_view.* FROM books_fts
+JOIN books_view ON books_view.id = books_fts.rowid
+WHERE books_fts MATCH ? ORDER BY books_fts.rank LIMIT ?
+        """
+
+# Shard databases opened by the current worker process, by file name.
+_worker_databases = {}
+
+
+def run_on_shard(database_name: str, task, *args):
+    """
+    Runs a task on a shard from a worker process, opening the shard on
+    first use.
+
+    Args:
+    database_name (str): Path of the shard file.
+    task: Name of a Database method, or a function taking the shard
+    Database as its first argument.
+    *args: Arguments of the task.
+
+    Returns:
+    The result of the task.
+    """
+
+    db = _worker_databases.get(database_name)
+    if db is None:
+        db = _worker_databases[database_name] = Database(database_name,
+                                                         cache_size=0)
+
+    return call_task(db, task, *args)
+
+
+def call_task(db: Database, task, *args):
+    """Runs a task, see run_on_shard(), on a shard Database."""
+
+    if isinstance(task, str):
+        return getattr(db, task)(*args)
+
+    return task(db, *args)
+
+
+def search_shard(db: Database, keyword: str, columns: list[str],
+                 substring_fallback: bool, limit: int = None) -> list[tuple]:
+    """
+    Searches one shard like Database.search() and search_full_text(),
+    keeping the FTS5 score of every book, so results of several shards can
+    be merged by it.
+
+    Args:
+    db (Database): The shard.
+    keyword (str): Words to look for, each one is treated as a prefix.
+    columns (list[str]): Columns to search in.
+    substring_fallback (bool): Scan titles and authors for the keyword if
+    it contains no words, as search() does.
+    limit (int): Maximum amount of books returned (default is all of them).
+
+    Returns:
+    list[tuple]: (rank, UID, title, author, description, genre,
+    amount_of_pages) rows, best first. rank is the FTS5 score, lower is
+    better, and 0 for substring matches. It is computed against the
+    statistics of this shard only (amount of books, average length and
+    how many of them contain each word).
+    """
+
+    match_query = db._build_match_query(keyword, columns)
+    if not match_query:
+        if not substring_fallback:
+            return []
+        return [(0, *book)
+                for book in db._search_by_substring(keyword, limit)]
+
+    db.cursor.execute(RANKED_SEARCH_QUERY,
+                      (match_query, -1 if limit is None else limit))
+
+    return db.cursor.fetchall()
+
+
+class ShardedDatabase:
+    """
+    Class spreading the catalog over several SQLite files (shards) behind
+    the Database interface used by Library.
+
+    Every shard is a complete Database holding its own copy of the genres.
+    Shards number their books independently, and the book with local UID L
+    on shard S gets the global UID L * shards + S, so UIDs are unique and
+    tell their shard without any lookup. A new book gets the smallest local
+    UID that makes its global UID larger than every earlier one, so global
+    UIDs grow in the order books are added, as in a single database.
+
+    Searches and whole listings are scattered over the shards, run in a pool
+    of worker processes with their own connections and merged in order, so
+    they use several cores. Worker processes only see committed changes.
+    Pages of books are small index lookups and are read in this process.
+    Writes go to one shard each; a batch is committed shard by shard, so it
+    is not atomic across shards.
+    """
+
+    # Ways of choosing the shard of a new book: 'id' spreads books evenly
+    # over the shards in turn, 'genre' keeps every genre on one shard, so
+    # genre listings read a single shard.
+    PARTITIONS = ('id', 'genre')
+
+    SORT_COLUMNS = Database.SORT_COLUMNS
+
+    def __init__(self, database_name: str = 'database.db', shards: int = 4,
+                 partition: str = 'id', processes: int = None,
+                 pooled: bool = False, pragmas: dict = None,
+                 cache_size: int = 1024, stats: QueryStats = None):
+        """
+        Opens (and creates or migrates) the shard files.
+
+        Args:
+        database_name (str): Path the shard paths are derived from, e.g.
+        'database.db' gives 'database.0.db', 'database.1.db'...
+        shards (int): Amount of shards. It must not change once books were
+        added, since UIDs depend on it.
+        partition (str): One of PARTITIONS. It must not change once books
+        were added either.
+        processes (int): Amount of worker processes running searches (default
+        is one per shard, at most one per CPU). 0 runs them one shard after
+        another in this process, where uncommitted changes are visible.
+        pooled (bool): Per-thread connections, see Database.
+        pragmas (dict): PRAGMA overrides, see Database.
+        cache_size (int): Maximum amount of merged lookup results cached, 0
+        disables caching.
+        stats (QueryStats): Passed to every shard, see Database.
+
+        Raises:
+        ValueError: If shards is below 1 or partition is unknown.
+        """
+
+        if shards < 1:
+            raise ValueError('There must be at least one shard')
+        if partition not in self.PARTITIONS:
+            raise ValueError(f'Unknown partition {partition!r}, expected one '
+                             f'of {", ".join(self.PARTITIONS)}')
+
+        root, extension = os.path.splitext(database_name)
+        self.database_name = database_name
+        self.partition = partition
+        self.stats = stats
+        self.shards = [Database(f'{root}.{index}{extension or ".db"}',
+                                pooled=pooled, pragmas=pragmas, cache_size=0,
+                                stats=stats)
+                       for index in range(shards)]
+        self.processes = (min(shards, os.cpu_count() or 1)
+                          if processes is None else processes)
+        self._executor = None
+        self._cache = LRUCache(cache_size)
+        self._prefix_index = None
+        self._prefix_index_lock = threading.Lock()
+        self._next_shard = self.get_amount_of_books() % shards
+        self._last_uid = self._get_last_uid()
+
+
+    def _global_uid(self, local_uid: int, shard: int) -> int:
+        """Converts the UID of a book on a shard into its global UID."""
+
+        return local_uid * len(self.shards) + shard
+
+
+    def _global_book(self, book: tuple, shard: int) -> tuple:
+        """Converts a book record of a shard to global UIDs."""
+
+        return (book[0] * len(self.shards) + shard, *book[1:])
+
+
+    def _locate(self, uid: int) -> tuple[Database, int]:
+        """Gets the shard of a global UID and the book's UID on it."""
+
+        local_uid, shard = divmod(uid, len(self.shards))
+
+        return self.shards[shard], local_uid
+
+
+    def _genre_shard(self, genre: str) -> int:
+        """Gets the shard holding the books of a genre under 'genre'
+        partitioning."""
+
+        return zlib.crc32(genre.encode('utf-8')) % len(self.shards)
+
+
+    def _shards_of_genre(self, genre: str = None) -> list[int]:
+        """Gets the shards that may hold books of a genre."""
+
+        if genre is not None and self.partition == 'genre':
+            return [self._genre_shard(genre)]
+
+        return list(range(len(self.shards)))
+
+
+    def _choose_shard(self, book: Book) -> int:
+        """Chooses the shard a new book is stored on."""
+
+        if self.partition == 'genre':
+            return self._genre_shard(book.genre)
+
+        shard = self._next_shard
+        self._next_shard = (shard + 1) % len(self.shards)
+
+        return shard
+
+
+    def _get_last_uid(self) -> int:
+        """Gets the largest global UID of the stored books, 0 if none."""
+
+        book = self.get_last_book_added()
+
+        return book[0] if book else 0
+
+
+    def _place_book(self, book: Book) -> tuple[int, Book]:
+        """
+        Chooses the shard of a new book and its UID on it.
+
+        Returns:
+        tuple[int, Book]: The shard and the book with its local UID set, the
+        smallest one giving a global UID above every earlier one.
+        """
+
+        shard = self._choose_shard(book)
+        local_uid = (self._last_uid - shard) // len(self.shards) + 1
+        self._last_uid = self._global_uid(local_uid, shard)
+
+        return shard, Book(book.title, book.author, book.description,
+                           book.genre, book.amount_of_pages, local_uid)
+
+
+    def _scatter(self, task, *args, shards: list[int] = None) -> list[tuple]:
+        """
+        Runs a task, see run_on_shard(), on several shards at once.
+
+        Args:
+        task: Name of a Database method or a module-level function taking
+        the shard Database first.
+        *args: Arguments of the task.
+        shards (list[int]): Shards to run it on (default is all of them).
+
+        Returns:
+        list[tuple]: (shard, result) pairs in shard order.
+        """
+
+        if shards is None:
+            shards = range(len(self.shards))
+        if self.processes <= 0 or len(shards) == 1:
+            return [(shard, call_task(self.shards[shard], task, *args))
+                    for shard in shards]
+
+        if self._executor is None:
+            # Spawned workers do not inherit the open SQLite connections.
+            self._executor = ProcessPoolExecutor(
+                self.processes, multiprocessing.get_context('spawn'))
+        futures = [(shard, self._executor.submit(
+                        run_on_shard, self.shards[shard].database_name,
+                        task, *args))
+                   for shard in shards]
+
+        return [(shard, future.result()) for shard, future in futures]
+
+
+    def _merge_by_uid(self, results: list[tuple]) -> list[tuple]:
+        """Merges UID-ordered book lists of several shards by global
+        UID."""
+
+        return list(heapq.merge(
+            *([self._global_book(book, shard) for book in books]
+              for shard, books in results),
+            key=lambda book: book[0]))
+
+
+    def add_new_genres(self, genres: list[str], silent: bool = False) -> None:
+        """Adds genres to every shard, see Database.add_new_genres."""
+
+        for index, shard in enumerate(self.shards):
+            shard.add_new_genres(genres, silent or index > 0)
+        self._cache.invalidate()
+
+
+    @cached_lookup
+    def search(self, keyword: str, limit: int = None) -> list[tuple]:
+        """
+        Searches books by title and author on all shards, see
+        Database.search.
+
+        Returns:
+        list[tuple]: A list of book records, approximately best matches
+        first, see _search().
+        """
+
+        return self._search(keyword, ['title', 'author'], True, limit)
+
+
+    @cached_lookup
+    def search_full_text(self, keyword: str, columns: list[str] = None,
+                         limit: int = None) -> list[tuple]:
+        """
+        Searches books including their description on all shards, see
+        Database.search_full_text.
+
+        Returns:
+        list[tuple]: A list of book records, approximately best matches
+        first, see _search().
+        """
+
+        return self._search(keyword,
+                            columns or ['title', 'author', 'description'],
+                            False, limit)
+
+
+    def _search(self, keyword: str, columns: list[str],
+                substring_fallback: bool, limit: int = None) -> list[tuple]:
+        """
+        Scatters search_shard() and merges the results by their FTS5 score.
+        Every shard returns at most limit books, enough for the merged top.
+
+        Behavior:
+        Every shard scores its books against its own statistics, so the
+        scores of different shards are only comparable when the shards hold
+        similar books. With partition='id' they nearly are, and the merged
+        order is close to the one of a single database. With
+        partition='genre' a word common in one genre but rare in another
+        weighs differently on their shards, and the merged order is only
+        an approximation of relevance. Within a shard the order is exact.
+        """
+
+        results = self._scatter(search_shard, keyword, columns,
+                                substring_fallback, limit)
+        ranked_books = heapq.merge(
+            *([(book[0], self._global_book(book[1:], shard))
+               for book in books] for shard, books in results),
+            key=lambda ranked_book: ranked_book[0])
+
+        return [book for _, book in islice(ranked_books, limit)]
+
+
+    @cached_lookup
+    def fuzzy_search(self, keyword: str, limit: int = 10,
+                     threshold: float = 0.3) -> list[tuple]:
+        """
+        Typo-tolerant search on all shards, see Database.fuzzy_search.
+
+        Returns:
+        list[tuple]: A list of book records, most similar first.
+        """
+
+        query_trigrams = fuzzy.trigrams(keyword)
+        scored_books = [
+            (fuzzy.similarity(query_trigrams, f'{book[1]} {book[2]}'),
+             self._global_book(book, shard))
+            for shard, books in self._scatter('fuzzy_search', keyword, limit,
+                                              threshold)
+            for book in books]
+        scored_books.sort(key=lambda scored: (scored[0], -scored[1][0]),
+                          reverse=True)
+
+        return [book for _, book in scored_books[:limit]]
+
+
+    def autocomplete(self, prefix: str, limit: int = 10) -> list[str]:
+        """
+        Completes the beginning of a book title or author name across all
+        shards, see Database.autocomplete.
+        """
+
+        return self._get_prefix_index().complete(prefix, limit)
+
+
+    def _get_prefix_index(self) -> PrefixIndex:
+        """Gets the autocomplete() index, loading it on first use."""
+
+        with self._prefix_index_lock:
+            if self._prefix_index is None:
+                index = PrefixIndex()
+                for shard in self.shards:
+                    shard.cursor.execute('SELECT title, author FROM books')
+                    index.add_many(chain.from_iterable(
+                        shard.cursor.fetchall()))
+                self._prefix_index = index
+
+            return self._prefix_index
+
+
+    def get_all_genres(self) -> list[tuple]:
+        """Gets all genres, see Database.get_all_genres."""
+
+        return self.shards[0].get_all_genres()
+
+
+    def get_genres_by_prefix(self, prefix: str, limit: int = 10,
+                             offset: int = 0) -> tuple[list[tuple], bool]:
+        """Gets a page of genres, see Database.get_genres_by_prefix."""
+
+        return self.shards[0].get_genres_by_prefix(prefix, limit, offset)
+
+
+    def delete_book(self, uid: int) -> int:
+        """
+        Deletes a book by its global UID.
+
+        Returns:
+        int: Amount of deleted books, 0 if the book did not exist.
+        """
+
+        shard, local_uid = self._locate(uid)
+        book = None
+        if self._prefix_index is not None:
+            book = shard.get_book_by_uid(local_uid)
+
+        deleted = shard.delete_book(local_uid)
+        if book:
+            self._prefix_index.remove_many(book[1:3])
+        self._cache.invalidate()
+
+        return deleted
+
+
+    def add_new_book(self, book: Book) -> int:
+        """
+        Adds a new book to the shard chosen by the partition.
+
+        Returns:
+        int: Global UID of the added book.
+        """
+
+        shard, book = self._place_book(book)
+        uid = self._global_uid(self.shards[shard].add_new_book(book), shard)
+        if self._prefix_index is not None:
+            self._prefix_index.add_many((book.title, book.author))
+        self._cache.invalidate()
+
+        return uid
+
+
+    def add_new_books(self, books: Iterable[Book]) -> int:
+        """
+        Adds many new books, with one Database.add_new_books() call per
+        shard.
+
+        Returns:
+        int: Amount of added books.
+        """
+
+        shard_books = [[] for _ in self.shards]
+        for book in books:
+            shard, book = self._place_book(book)
+            shard_books[shard].append(book)
+
+        added = 0
+        for shard, books_of_shard in zip(self.shards, shard_books):
+            if books_of_shard:
+                added += shard.add_new_books(books_of_shard)
+        if self._prefix_index is not None:
+            self._prefix_index.add_many(chain.from_iterable(
+                (book.title, book.author)
+                for books_of_shard in shard_books
+                for book in books_of_shard))
+        self._cache.invalidate()
+
+        return added
+
+
+    @cached_lookup
+    def get_book_by_uid(self, uid: int) -> tuple:
+        """Gets a book by its global UID, see Database.get_book_by_uid."""
+
+        shard, local_uid = self._locate(uid)
+        book = shard.get_book_by_uid(local_uid)
+
+        return (uid, *book[1:]) if book else book
+
+
+    def get_all_books(self) -> list[tuple]:
+        """Gets all books ordered by global UID, see
+        Database.get_all_books."""
+
+        return self._merge_by_uid(self._scatter('get_all_books'))
+
+
+    @cached_lookup
+    def get_all_books_by_genre(self, genre: str) -> list[tuple]:
+        """Gets all books of a genre ordered by global UID."""
+
+        return self._merge_by_uid(self._scatter(
+            'get_all_books_by_genre', genre,
+            shards=self._shards_of_genre(genre)))
+
+
+    def iter_books(self, genre: str = None, keyword: str = None,
+                   batch_size: int = 1000,
+                   as_books: bool = False) -> Iterator[tuple]:
+        """
+        Lazily iterates over books ordered by global UID, see
+        Database.iter_books.
+        """
+
+        def shard_books(shard: int) -> Iterator[tuple]:
+            for book in self.shards[shard].iter_books(genre, keyword,
+                                                      batch_size):
+                yield self._global_book(book, shard)
+
+        books = heapq.merge(*(shard_books(shard)
+                              for shard in self._shards_of_genre(genre)),
+                            key=lambda book: book[0])
+        for book in books:
+            yield Book.from_row(book) if as_books else book
+
+
+    def get_books_page(self, page_size: int = 10, after_uid: int = None,
+                       before_uid: int = None, genre: str = None,
+                       keyword: str = None, sort_by: str = 'id',
+                       descending: bool = False,
+                       sort_value: object = None) -> BooksPage:
+        """
+        Retrieves one page of books across the shards, see
+        Database.get_books_page.
+
+        Behavior:
+        Every shard returns its own page next to the boundary book, with the
+        boundary UID rounded to the nearest local UID on the boundary's side,
+        so that comparing local UIDs gives the same result as comparing
+        global ones. The pages are merged by (sort value, global UID) and
+        cut to page_size, so a page costs one index range lookup per shard.
+        Pages sorted by 'rank' are listed by UID.
+        """
+
+        if sort_by not in self.SORT_COLUMNS:
+            raise ValueError(f'Cannot sort books by {sort_by!r}, expected one '
+                             f'of {", ".join(self.SORT_COLUMNS)}')
+
+        if sort_by == 'rank':
+            # Every shard scores relevance against its own books, so pages
+            # of several shards cannot be merged by it.
+            sort_by = 'id'
+        sort_column, sort_index = self.SORT_COLUMNS[sort_by]
+        backwards = after_uid is None and before_uid is not None
+        boundary_uid = after_uid if after_uid is not None else before_uid
+        if (boundary_uid is not None and sort_column is not None
+                and sort_value is None):
+            boundary_book = self.get_book_by_uid(boundary_uid)
+            if not boundary_book:
+                raise LookupError(f'Book {boundary_uid} does not exist')
+            sort_value = boundary_book[sort_index]
+
+        amount_of_shards = len(self.shards)
+        # Whether the page holds keys above the boundary or below it.
+        above = descending == backwards
+        pages = []
+        for shard in self._shards_of_genre(genre):
+            local_uid = None
+            if boundary_uid is not None and above:
+                local_uid = (boundary_uid - shard) // amount_of_shards
+            elif boundary_uid is not None:
+                local_uid = -((shard - boundary_uid) // amount_of_shards)
+            page = self.shards[shard].get_books_page(
+                page_size,
+                after_uid=None if backwards else local_uid,
+                before_uid=local_uid if backwards else None,
+                genre=genre, keyword=keyword, sort_by=sort_by,
+                descending=descending, sort_value=sort_value)
+            pages.append((shard, page))
+
+        def sort_key(book: tuple) -> tuple:
+            value = book[sort_index]
+            if sort_column is not None and 'NOCASE' in sort_column:
+                value = value.translate(NOCASE)
+            return value, book[0]
+
+        books = list(heapq.merge(
+            *([self._global_book(book, shard) for book in page.books]
+              for shard, page in pages),
+            key=sort_key, reverse=descending))
+        has_more = len(books) > page_size
+        books = books[-page_size:] if backwards else books[:page_size]
+
+        result = BooksPage(books, has_next=False, has_prev=False,
+                           sort_index=sort_index)
+        if backwards:
+            result.has_prev = has_more or any(page.has_prev
+                                              for _, page in pages)
+            result.has_next = any(page.has_next for _, page in pages)
+        else:
+            result.has_next = has_more or any(page.has_next
+                                              for _, page in pages)
+            result.has_prev = any(page.has_prev for _, page in pages)
+
+        return result
+
+
+    def get_last_book_added(self) -> tuple:
+        """
+        Gets the book with the largest global UID, which is the last one
+        added, see Database.get_last_book_added.
+        """
+
+        books = []
+        for index, shard in enumerate(self.shards):
+            book = shard.get_last_book_added()
+            if book:
+                books.append(self._global_book(book, index))
+
+        return max(books, key=lambda book: book[0], default=None)
+
+
+    def get_amount_of_books(self) -> int:
+        """Gets the amount of books on all shards."""
+
+        return sum(shard.get_amount_of_books() for shard in self.shards)
+
+
+    def is_empty(self) -> bool:
+        """Checks whether no shard holds any book."""
+
+        return all(shard.is_empty() for shard in self.shards)
+
+
+    def get_amount_of_books_by_genre(self, genre: str) -> int:
+        """Gets the amount of books of a genre on all shards."""
+
+        return sum(self.shards[shard].get_amount_of_books_by_genre(genre)
+                   for shard in self._shards_of_genre(genre))
+
+
+    def get_statistics(self) -> dict:
+        """Combines the catalog statistics of all shards, see
+        Database.get_statistics."""
+
+        shard_statistics = [shard.get_statistics() for shard in self.shards]
+        pages_min = [statistics['pages_min']
+                     for statistics in shard_statistics
+                     if statistics['pages_min'] is not None]
+        pages_max = [statistics['pages_max']
+                     for statistics in shard_statistics
+                     if statistics['pages_max'] is not None]
+        amount_of_books_by_genre = {}
+        for statistics in shard_statistics:
+            for genre, amount in \
+                    statistics['amount_of_books_by_genre'].items():
+                amount_of_books_by_genre[genre] = \
+                    amount_of_books_by_genre.get(genre, 0) + amount
+
+        return {'amount_of_books': sum(statistics['amount_of_books']
+                                       for statistics in shard_statistics),
+                'pages_min': min(pages_min, default=None),
+                'pages_max': max(pages_max, default=None),
+                'pages_sum': sum(statistics['pages_sum'] or 0
+                                 for statistics in shard_statistics),
+                'amount_of_books_by_genre': amount_of_books_by_genre}
+
+
+    def get_cache_stats(self) -> dict:
+        """Gets the usage statistics of the merged results cache."""
+
+        return self._cache.get_stats()
+
+
+    @contextlib.contextmanager
+    def batch(self) -> Iterator[WriteBatch]:
+        """
+        Groups several writes, committed on every shard when the block
+        ends or rolled back if it raises, see Database.batch.
+        """
+
+        write_batch = WriteBatch(self)
+        try:
+            yield write_batch
+        except BaseException:
+            self.rollback_changes()
+            raise
+
+        self.commit_changes()
+
+
+    def commit_changes(self) -> None:
+        for shard in self.shards:
+            shard.commit_changes()
+        self._cache.invalidate()
+
+
+    def rollback_changes(self) -> None:
+        for shard in self.shards:
+            shard.rollback_changes()
+        self._prefix_index = None
+        self._next_shard = self.get_amount_of_books() % len(self.shards)
+        self._last_uid = self._get_last_uid()
+        self._cache.invalidate()
+
+
+    def close_connection(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        for shard in self.shards:
+            shard.close_connection()
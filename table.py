@@ -0,0 +1,88 @@
+"""Lightweight fixed-width table rendering for the Library"""
+import sys
+from typing import Iterable, TextIO
+
+
+class TableRenderer:
+    """
+    Renders rows as a fixed-width text table, without PrettyTable.
+
+    Column widths are computed once per rendered page from the already
+    truncated cells, and the whole page is written to the stream at once.
+    """
+
+    def __init__(self, headers: list[str], max_widths: dict = None,
+                 right_aligned: Iterable[int] = ()) -> None:
+        """
+        Args:
+        headers (list[str]): Column headers.
+        max_widths (dict): Column index mapped to the maximum amount of
+        characters kept; longer values are cut and end with '...'.
+        right_aligned (Iterable[int]): Indexes of right-aligned (numeric)
+        columns; the others are left-aligned.
+        """
+
+        max_widths = max_widths or {}
+        self.headers = list(headers)
+        self._slices = [slice(max_widths[index])
+                        if index in max_widths else None
+                        for index in range(len(self.headers))]
+        self._aligns = ['>' if index in right_aligned else '<'
+                        for index in range(len(self.headers))]
+
+
+    def _cells(self, row: Iterable) -> list[str]:
+        """Converts a row into its (truncated) text cells."""
+
+        cells = []
+        for value, cut in zip(row, self._slices):
+            cell = value if isinstance(value, str) else str(value)
+            if cut is not None and len(cell) > cut.stop:
+                cell = f'{cell[cut]}...'
+            cells.append(cell)
+
+        return cells
+
+
+    def render(self, rows: Iterable[Iterable]) -> str:
+        """
+        Renders rows as a table.
+
+        Args:
+        rows (Iterable[Iterable]): Rows with one value per header.
+
+        Returns:
+        str: Table text ending with a newline.
+        """
+
+        table = [self._cells(row) for row in rows]
+        widths = [len(header) for header in self.headers]
+        for cells in table:
+            for index, cell in enumerate(cells):
+                if len(cell) > widths[index]:
+                    widths[index] = len(cell)
+
+        border = '+' + '+'.join('-' * (width + 2) for width in widths) + '+\n'
+        row_format = '| ' + ' | '.join(
+            f'{{:{align}{width}}}'
+            for align, width in zip(self._aligns, widths)) + ' |\n'
+        header_format = '| ' + ' | '.join(
+            f'{{:^{width}}}' for width in widths) + ' |\n'
+
+        lines = [border, header_format.format(*self.headers), border]
+        lines.extend(row_format.format(*cells) for cells in table)
+        lines.append(border)
+
+        return ''.join(lines)
+
+
+    def write(self, rows: Iterable[Iterable], stream: TextIO = None) -> None:
+        """
+        Renders rows as a table and writes it to a stream.
+
+        Args:
+        rows (Iterable[Iterable]): Rows with one value per header.
+        stream (TextIO): Output stream (default is sys.stdout).
+        """
+
+        (stream or sys.stdout).write(self.render(rows))